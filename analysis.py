@@ -0,0 +1,223 @@
+"""
+Headless batch analysis of stored games.
+
+Every position of every game is searched to a fixed depth, the played
+move is compared with the engine's best one and tagged by how much it
+lost. Games are streamed from PGN files (or FEN files, one position per
+line) and dealt to a process pool in chunks. Results of a finished chunk
+are appended to a JSON lines file at once, so a killed run started again
+with the same arguments skips every chunk that is already in the file.
+
+Records:
+    {"settings": {...}}                                      first line
+    {"chunk", "game", "ply", "fen", "move", "best", "score", "swing", "tag"}
+    {"chunk", "game", "error"}                               invalid game
+    {"chunk", "done": true, "games", "positions", "seconds"}
+
+Scores are in centipawns from the side to move's view, mates are
+engine.MATE minus plies to mate.
+
+Usage:
+    python analysis.py games.pgn [more.pgn ...] -o analysis.jsonl -w 8
+    python analysis.py positions.fen -d 5
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import consts
+import engine
+import pgn
+from position import Position, START_FEN
+
+DEPTH = 3
+CHUNK = 8
+# centipawns a move loses to get a tag, biggest first
+TAGS = (("blunder", 300), ("mistake", 100), ("inaccuracy", 50))
+# swings are measured between scores clamped to this, so a missed mate counts like a lost piece
+CLAMP = 1000
+
+
+def read_inputs(paths: list[str]):
+    # yields (headers, SAN moves) of games in PGN files and positions in FEN files
+    for path in paths:
+        file = sys.stdin if path == "-" else open(path, encoding = "utf-8", errors = "replace")
+        with file:
+            if path.endswith((".fen", ".epd")):
+                for line in file:
+                    if line.strip():
+                        yield {"FEN": line.strip()}, []
+            else:
+                for headers, moves, _ in pgn.read_games(file):
+                    yield headers, moves
+
+def chunks(games, size: int):
+    # yields (chunk index, [(game index, headers, moves), ...])
+    games = enumerate(games)
+    for index in itertools.count():
+        chunk = [(number, headers, moves) for number, (headers, moves) in itertools.islice(games, size)]
+        if not chunk:
+            return
+        yield index, chunk
+
+def _clamp(score: int) -> int:
+    return max(-CLAMP, min(CLAMP, score))
+
+def tag(swing: int) -> str | None:
+    for name, threshold in TAGS:
+        if swing >= threshold:
+            return name
+    return None
+
+
+# engine of a worker process
+_engine = None
+
+def _init_worker(table_size: int):
+    global _engine
+    _engine = engine.Engine(table_size)
+
+def _score(pos: Position, depth: int, seconds: float) -> tuple[int | None, int]:
+    # (best move, score) of pos, positions without moves are scored by the rules
+    move, score, _ = _engine.search(pos, seconds, depth)
+    if move is None:
+        return None, -engine.MATE if pos.in_check() else 0
+    return move, score
+
+def analyze_game(chunk: int, number: int, headers: dict, moves: list[str], depth: int, seconds: float) -> list[dict]:
+    """
+    Returns a record for every position of the game. The score of a played
+    move is the negated score of the position it leads to, so every
+    position is searched once
+    """
+    # fresh table per game, results don't depend on how games were dealt
+    _engine.table.clear()
+    try:
+        pos = Position.from_fen(headers.get("FEN", START_FEN))
+        played = []
+        for text in moves:
+            move = pgn.parse_san(pos, text)
+            played.append(move)
+            pos.make_move(move)
+    except ValueError as error:
+        return [{"chunk": chunk, "game": number, "error": str(error)}]
+    while pos.stack:
+        pos.unmake_move()
+
+    records = []
+    best, score = _score(pos, depth, seconds)
+    for ply in range(len(played) + 1):
+        record = {"chunk": chunk, "game": number, "ply": ply, "fen": pos.fen(), "move": None,
+                  "best": pgn.san(pos, best) if best is not None else None, "score": score, "swing": None, "tag": None}
+        records.append(record)
+        if ply == len(played):
+            break
+        record["move"] = pgn.san(pos, played[ply])
+        pos.make_move(played[ply])
+        next_best, next_score = _score(pos, depth, seconds)
+        record["swing"] = max(_clamp(score) - _clamp(-next_score), 0) if played[ply] != best else 0
+        record["tag"] = tag(record["swing"])
+        best, score = next_best, next_score
+    return records
+
+def _analyze_chunk(chunk: int, games: list, depth: int, seconds: float) -> list[dict]:
+    start = time.perf_counter()
+    records = []
+    for number, headers, moves in games:
+        records += analyze_game(chunk, number, headers, moves, depth, seconds)
+    positions = sum("ply" in record for record in records)
+    records.append({"chunk": chunk, "done": True, "games": len(games), "positions": positions,
+                    "seconds": round(time.perf_counter() - start, 3)})
+    return records
+
+def completed(path: str, settings: dict) -> set[int]:
+    """
+    Returns indices of chunks already finished in the output file. Lines of
+    chunks cut off by a killed run are dropped, the file is rewritten if needed.
+    Raises ValueError if the file was written with other settings
+    """
+    if not os.path.exists(path):
+        return set()
+    records, broken = [], False
+    with open(path, encoding = "utf-8") as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # last line of a killed write
+                broken = True
+                break
+    if records and records[0].get("settings") != settings:
+        raise ValueError(f"{path} was written with settings {records[0].get('settings')}, not {settings}")
+    done = {record["chunk"] for record in records if record.get("done")}
+    kept = [record for record in records if "settings" in record or record["chunk"] in done]
+    if broken or len(kept) != len(records) or not records:
+        with open(path + ".tmp", "w", encoding = "utf-8") as file:
+            file.writelines(json.dumps(record) + "\n" for record in kept)
+        os.replace(path + ".tmp", path)
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description = "Analyze every position of stored games with the engine")
+    parser.add_argument("files", nargs = "+", help = "PGN files, or FEN files ending in .fen/.epd, - reads PGN from stdin")
+    parser.add_argument("-o", "--out", default = "analysis.jsonl", help = "JSON lines file, resumed if it exists")
+    parser.add_argument("-d", "--depth", type = int, default = DEPTH, help = "search depth per position")
+    parser.add_argument("-t", "--seconds", type = float, default = 60.0, help = "time limit per position")
+    parser.add_argument("-w", "--workers", type = int, default = os.cpu_count(), help = "worker processes")
+    parser.add_argument("--chunk", type = int, default = CHUNK, help = "games per work unit")
+    args = parser.parse_args()
+
+    settings = {"files": args.files, "depth": args.depth, "seconds": args.seconds, "chunk": args.chunk}
+    try:
+        done = completed(args.out, settings)
+    except ValueError as error:
+        sys.exit(str(error))
+    out = open(args.out, "a", encoding = "utf-8")
+    if not out.tell():
+        out.write(json.dumps({"settings": settings}) + "\n")
+    if done:
+        print(f"resuming, {len(done)} chunks already done", file = sys.stderr)
+
+    games = positions = 0
+    start = time.perf_counter()
+
+    def write(records: list[dict]):
+        nonlocal games, positions
+        # whole chunk in one write, the done record last
+        out.write("".join(json.dumps(record) + "\n" for record in records))
+        out.flush()
+        games += records[-1]["games"]
+        positions += records[-1]["positions"]
+        seconds = time.perf_counter() - start
+        print(f"chunk {records[-1]['chunk']} done: {games} games, {positions} positions in {seconds:.1f}s, "
+              f"{positions / seconds:.1f} positions/s", file = sys.stderr)
+
+    pool = ProcessPoolExecutor(args.workers, initializer = _init_worker, initargs = (consts.ENGINE_TT_SIZE,))
+    pending = set()
+    try:
+        for index, chunk in chunks(read_inputs(args.files), args.chunk):
+            if index in done:
+                continue
+            pending.add(pool.submit(_analyze_chunk, index, chunk, args.depth, args.seconds))
+            # only a few chunks wait in the queue, the input is read as they finish
+            if len(pending) >= 2 * args.workers:
+                finished, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+        for future in wait(pending).done:
+            write(future.result())
+    except KeyboardInterrupt:
+        print("interrupted, run again with the same arguments to resume", file = sys.stderr)
+        pool.shutdown(wait = False, cancel_futures = True)
+        out.close()
+        sys.exit(130)
+    pool.shutdown()
+    out.close()
+
+if __name__ == "__main__":
+    main()
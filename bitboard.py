@@ -0,0 +1,142 @@
+"""
+Bitboard tables and attack lookups used by the move generator.
+
+Squares are numbered a1 = 0, b1 = 1, ..., h1 = 7, a2 = 8, ..., h8 = 63
+and every set of squares is a 64-bit integer with one bit per square.
+Leaper attacks (knight, king, pawn) are precomputed per square, sliding
+attacks are computed with hyperbola quintessence on files and diagonals
+and with a first-rank lookup on ranks.
+"""
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+FILE_A = 0x0101010101010101
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+# a1, c1, ..., b2, d2, ... are dark
+DARK_SQUARES = 0xAA55AA55AA55AA55
+
+TILES = [f"{letter}{num}" for num in range(1, 9) for letter in "abcdefgh"]
+SQUARES = {tile: sq for sq, tile in enumerate(TILES)}
+
+
+def square(tile: str) -> int:
+    # "e4" -> 28
+    return (ord(tile[0]) - ord("a")) + 8 * (int(tile[1]) - 1)
+
+def tile(sq: int) -> str:
+    # 28 -> "e4"
+    return TILES[sq]
+
+def bits(bb: int):
+    # yields indices of all set bits, lowest first
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+def lsb(bb: int) -> int:
+    return (bb & -bb).bit_length() - 1
+
+def tiles(bb: int) -> list[str]:
+    return [TILES[sq] for sq in bits(bb)]
+
+def flip(bb: int) -> int:
+    # mirrors the board vertically (byte swap), used by hyperbola quintessence
+    return int.from_bytes(bb.to_bytes(8, "little"), "big")
+
+
+def _leaper(steps) -> list[int]:
+    table = []
+    for sq in range(64):
+        file, rank = sq & 7, sq >> 3
+        bb = 0
+        for df, dr in steps:
+            if 0 <= file + df < 8 and 0 <= rank + dr < 8:
+                bb |= 1 << (sq + df + 8 * dr)
+        table.append(bb)
+    return table
+
+KNIGHT_ATTACKS = _leaper(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+KING_ATTACKS = _leaper(((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)))
+# PAWN_ATTACKS[color][sq], color 0 is white and 1 is black
+PAWN_ATTACKS = [_leaper(((-1, 1), (1, 1))), _leaper(((-1, -1), (1, -1)))]
+
+
+def _line_mask(sq, df, dr) -> int:
+    # every square on the line through sq in both directions, sq excluded
+    bb = 0
+    for sign in (1, -1):
+        file, rank = (sq & 7) + sign * df, (sq >> 3) + sign * dr
+        while 0 <= file < 8 and 0 <= rank < 8:
+            bb |= 1 << (file + 8 * rank)
+            file, rank = file + sign * df, rank + sign * dr
+    return bb
+
+FILE_MASKS = [_line_mask(sq, 0, 1) for sq in range(64)]
+DIAGONAL_MASKS = [_line_mask(sq, 1, 1) for sq in range(64)]
+ANTI_DIAGONAL_MASKS = [_line_mask(sq, -1, 1) for sq in range(64)]
+FLIPPED = [flip(1 << sq) for sq in range(64)]
+
+def _first_rank_attacks() -> list[list[int]]:
+    # FIRST_RANK[file][inner occupancy] -> attacked byte on the first rank
+    table = []
+    for file in range(8):
+        row = []
+        for inner in range(64):
+            occ = inner << 1
+            attacks = 0
+            for step in (1, -1):
+                f = file + step
+                while 0 <= f < 8:
+                    attacks |= 1 << f
+                    if occ & (1 << f):
+                        break
+                    f += step
+            row.append(attacks)
+        table.append(row)
+    return table
+
+FIRST_RANK = _first_rank_attacks()
+
+
+def _hyperbola(occ: int, sq: int, mask: int) -> int:
+    forward = occ & mask
+    reverse = flip(forward)
+    forward = (forward - (1 << sq)) & FULL
+    reverse = (reverse - FLIPPED[sq]) & FULL
+    return (forward ^ flip(reverse)) & mask
+
+def rank_attacks(occ: int, sq: int) -> int:
+    shift = sq & 56
+    return FIRST_RANK[sq & 7][(occ >> (shift + 1)) & 63] << shift
+
+def file_attacks(occ: int, sq: int) -> int:
+    return _hyperbola(occ, sq, FILE_MASKS[sq])
+
+def bishop_attacks(occ: int, sq: int) -> int:
+    return _hyperbola(occ, sq, DIAGONAL_MASKS[sq]) | _hyperbola(occ, sq, ANTI_DIAGONAL_MASKS[sq])
+
+def rook_attacks(occ: int, sq: int) -> int:
+    return rank_attacks(occ, sq) | file_attacks(occ, sq)
+
+def queen_attacks(occ: int, sq: int) -> int:
+    return bishop_attacks(occ, sq) | rook_attacks(occ, sq)
+
+
+
+def _between() -> list[list[int]]:
+    # BETWEEN[a][b] -> squares strictly between a and b if they share a line
+    table = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for df, dr in ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)):
+            file, rank = (a & 7) + df, (a >> 3) + dr
+            between = 0
+            while 0 <= file < 8 and 0 <= rank < 8:
+                b = file + 8 * rank
+                table[a][b] = between
+                between |= 1 << b
+                file, rank = file + df, rank + dr
+    return table
+
+BETWEEN = _between()
@@ -0,0 +1,154 @@
+"""
+Opening book stored as a sorted binary file of fixed-size entries.
+
+Every entry is 16 bytes, big endian like Polyglot books: position hash
+(8 bytes, our Zobrist keys), move (2 bytes, encoded as in position.py),
+weight (2 bytes) and 4 unused bytes. Entries are sorted by hash, so the
+file is memory-mapped and searched with bisection, nothing is loaded up
+front and processes opening the same book share its pages.
+
+Usage:
+    python book.py build games.pgn [more.pgn ...] -o book.bin
+    python book.py probe --fen "<FEN>" -b book.bin
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+import consts
+import pgn
+from position import Position, START_FEN, uci
+
+ENTRY = struct.Struct(">QHHI")
+# plies of every game the builder takes into account
+BOOK_PLIES = 20
+# points a move gets for a win, draw and loss of the side that played it
+POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}
+
+
+class Book:
+    def __init__(self, path: str = consts.BOOK_FILE):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        # empty files can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ) if size else b""
+        self.size = size // ENTRY.size
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def key(self, index: int) -> int:
+        return int.from_bytes(self.data[index * ENTRY.size:index * ENTRY.size + 8], "big")
+
+    def entries(self, key: int) -> list[tuple[int, int]]:
+        """
+        Returns (move, weight) of every entry of position key,
+        first entry is found by bisection
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.size:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, low * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+            low += 1
+        return found
+
+    def choose(self, pos: Position, rng: random.Random = None) -> int | None:
+        """
+        Returns a book move of pos picked with probability given by its weight,
+        the heaviest one if rng is None, None if pos isn't in the book.
+        Moves not legal in pos (hash collisions) are ignored
+        """
+        legal = set(pos.legal_moves())
+        moves = [(move, weight) for move, weight in self.entries(pos.hash) if move in legal and weight]
+        if not moves:
+            return None
+        if rng is None:
+            return max(moves, key = lambda entry: entry[1])[0]
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+def build(paths: list[str], out: str, plies: int = BOOK_PLIES, min_games: int = 1) -> int:
+    """
+    Builds a book from PGN files, move weights are points scored
+    with them (2 per win, 1 per draw). Moves played in fewer than
+    min_games games are left out. Returns number of entries written
+    """
+    # (hash, move) -> [points, games]
+    counts = {}
+    for path in paths:
+        with open(path, encoding = "utf-8", errors = "replace") as file:
+            for headers, moves, result in pgn.read_games(file):
+                points = POINTS.get(result, (0, 0))
+                try:
+                    pos = Position.from_fen(headers.get("FEN", START_FEN))
+                    for text in moves[:plies]:
+                        move = pgn.parse_san(pos, text)
+                        entry = counts.setdefault((pos.hash, move), [0, 0])
+                        entry[0] += points[pos.turn]
+                        entry[1] += 1
+                        pos.make_move(move)
+                except ValueError:
+                    # moves up to the invalid one are still counted
+                    pass
+
+    entries = sorted((key, move, points) for (key, move), (points, games) in counts.items() if games >= min_games)
+    # weights are scaled down to fit in 16 bits
+    scale = max((points for _, _, points in entries), default = 0) / 0xFFFF
+    with open(out, "wb") as file:
+        for key, move, points in entries:
+            weight = int(points / scale) if scale > 1 else points
+            file.write(ENTRY.pack(key, move, weight, 0))
+    return len(entries)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Build or probe an opening book")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    builder = commands.add_parser("build", help = "build a book from PGN files")
+    builder.add_argument("files", nargs = "+", help = "PGN files")
+    builder.add_argument("-o", "--out", default = consts.BOOK_FILE, help = "book file to write")
+    builder.add_argument("--plies", type = int, default = BOOK_PLIES, help = "plies of every game to include")
+    builder.add_argument("--min-games", type = int, default = 1, help = "leave out moves played in fewer games")
+    prober = commands.add_parser("probe", help = "list book moves of a position")
+    prober.add_argument("--fen", default = START_FEN, help = "position to look up (default: start position)")
+    prober.add_argument("-b", "--book", default = consts.BOOK_FILE, help = "book file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"{build(args.files, args.out, args.plies, args.min_games)} entries written to {args.out}")
+        return
+    pos = Position.from_fen(args.fen)
+    with Book(args.book) as book:
+        legal = set(pos.legal_moves())
+        moves = sorted((entry for entry in book.entries(pos.hash) if entry[0] in legal), key = lambda entry: entry[1], reverse = True)
+        for move, weight in moves:
+            print(f"{pgn.san(pos, move):<8}{uci(move):<8}{weight}")
+        if not moves:
+            print("position is not in the book")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,6 @@ class Button:
                     FG_color = consts.FG_BTN_COLOR, BG_color = consts.BG_BTN_COLOR,
                     width = consts.BTN_WIDTH, height = consts.BTN_HEIGHT,
                     font_size = consts.BTN_TEXT_SIZE, type = Menu(), active = True):
-        pg.init()
         self.active = active
         self.centerx = centerx
         self.centery = centery
@@ -0,0 +1,77 @@
+"""
+Chess clocks driven by the wall clock.
+
+Time left is kept in seconds and charged from time.monotonic() when a
+move ends or the clocks are paused, so slow frames and long searches
+cost the player exactly the time that passed. Supports a Fischer
+increment, added after every move, and a simple delay, seconds of every
+move that aren't charged at all.
+"""
+
+import time
+
+COLORS = ("white", "black")
+
+
+class Clock:
+    def __init__(self, seconds: float, increment: float = 0.0, delay: float = 0.0):
+        self.remaining = {color: float(seconds) for color in COLORS}
+        self.increment = increment
+        self.delay = delay
+        # color whose move is being timed, seconds it took before the clocks were paused
+        # and when they were last started, None while paused
+        self.moving: str = None
+        self.used = 0.0
+        self.started: float = None
+
+    def running(self) -> bool:
+        return self.started is not None
+
+    def spent(self) -> float:
+        # seconds the current move has taken so far
+        return self.used + (time.monotonic() - self.started if self.started is not None else 0.0)
+
+    def left(self, color: str) -> float:
+        remaining = self.remaining[color]
+        if color == self.moving:
+            remaining -= max(self.spent() - self.delay, 0.0)
+        return max(remaining, 0.0)
+
+    def flagged(self, color: str) -> bool:
+        return self.left(color) == 0.0
+
+    def start(self, color: str):
+        """
+        Runs the clock of color, it's a no-op if it is already running.
+        If another color was moving its time is charged without increment
+        """
+        if color != self.moving:
+            self._charge()
+            self.moving = color
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def pause(self):
+        # stops the clocks in the middle of a move, the delay isn't given again on resume
+        if self.started is not None:
+            self.used += time.monotonic() - self.started
+            self.started = None
+
+    def press(self):
+        """
+        Ends the move of the moving color, charges it, adds the
+        increment and starts the opponent if the clocks were running
+        """
+        if (color := self.moving) is None:
+            return
+        running = self.running()
+        self._charge()
+        self.remaining[color] += self.increment
+        self.moving = COLORS[color == "white"]
+        if running:
+            self.started = time.monotonic()
+
+    def _charge(self):
+        if self.moving is not None:
+            self.remaining[self.moving] = self.left(self.moving)
+        self.moving, self.used, self.started = None, 0.0, None
@@ -1,7 +1,14 @@
 
 FPS = 60
 SIDE = 100
-TIME = 10 * 60 * FPS #u tickovima
+TIME = 10 * 60 # seconds on each clock
+INCREMENT = 0 # seconds added to a clock after every move
+DELAY = 0 # seconds of every move that aren't charged
+TT_SIZE = 2**16 # buckets in transposition table
+ENGINE_TT_SIZE = 2**17 # buckets in engine's search table
+ENGINE_WORKERS = 1 # processes the engine searches with
+BOOK_FILE = "book.bin" # opening book of the engine, see book.py
+TABLEBASE_DIR = "tablebases" # endgame tables, see tablebase.py
 TIMER_WIDTH = 2 * SIDE // 3
 TIMER_HEIGHT = SIDE // 4
 TIMER_BUFFER = SIDE // 30
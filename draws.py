@@ -0,0 +1,54 @@
+"""
+Draw rules that end a game without any player asking for a draw.
+
+Threefold repetition is checked against a position hash -> count dict
+the match updates with every move, the fifty-move rule against the
+halfmove clock and insufficient material by looking up the material
+signature in a precomputed set, so every check is constant time.
+"""
+
+from bitboard import DARK_SQUARES
+from position import Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN
+
+STALEMATE = "stalemate"
+REPETITION = "threefold repetition"
+FIFTY_MOVES = "fifty-move rule"
+MATERIAL = "insufficient material"
+# drawn with best play according to the endgame tablebase, see Match.update
+TABLEBASE = "endgame tablebase"
+
+# halfmove clock that ends the game, 50 moves of each side
+FIFTY_MOVE_PLIES = 100
+
+
+def signature(pos: Position) -> tuple[int, ...] | None:
+    """
+    Returns (knights, dark bishops, light bishops) of white followed by those
+    of black, None if there are pawns, rooks or queens on the board
+    """
+    white, black = pos.pieces[WHITE], pos.pieces[BLACK]
+    if white[PAWN] | white[ROOK] | white[QUEEN] | black[PAWN] | black[ROOK] | black[QUEEN]:
+        return None
+    return tuple(count for pieces in (white, black)
+                 for count in (pieces[KNIGHT].bit_count(), (pieces[BISHOP] & DARK_SQUARES).bit_count(),
+                               (pieces[BISHOP] & ~DARK_SQUARES).bit_count()))
+
+# signatures with which no sequence of legal moves ends in mate: bare kings,
+# a single minor piece, or any number of bishops all on the same square color
+DEAD = frozenset([(0, 0, 0, 0, 0, 0), (1, 0, 0, 0, 0, 0), (0, 0, 0, 1, 0, 0)] +
+                 [(0, white, 0, 0, black, 0) for white in range(11) for black in range(11)] +
+                 [(0, 0, white, 0, 0, black) for white in range(11) for black in range(11)])
+
+
+def reason(pos: Position, repetitions: int) -> str | None:
+    """
+    Returns the rule by which pos, reached for the given number of times,
+    is drawn, None if the game goes on. Mate and stalemate are up to the caller
+    """
+    if pos.halfmove >= FIFTY_MOVE_PLIES:
+        return FIFTY_MOVES
+    if repetitions >= 3:
+        return REPETITION
+    if signature(pos) in DEAD:
+        return MATERIAL
+    return None
@@ -0,0 +1,382 @@
+"""
+Built-in computer opponent.
+
+Iterative deepening negamax with alpha-beta pruning, a transposition
+table and quiescence search over captures. Moves are ordered by the
+table move, captures by MVV-LVA, killer moves and the rest. Evaluation
+is material plus piece-square tables from the side to move's view.
+Search runs in its own thread, so the GUI keeps drawing while it thinks.
+
+Positions found in the opening book or in endgame tablebases are
+answered without searching.
+
+With more than one worker the root moves are split between worker
+processes, each searching its share with its own table. One worker
+searches in-process and is deterministic for a given depth.
+
+Usage:
+    python engine.py -t 5 -w 1 2 4 8          nodes per second by worker count
+    python engine.py --fen "<FEN>" -d 6 --book book.bin
+"""
+
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import book
+import consts
+import tablebase
+import ttable
+from position import Position, START_FEN, WHITE, PAWN, CAPTURES, kind_of, move_from, move_to, move_promotion, uci
+
+VALUES = [0, 100, 320, 330, 500, 900, 0]
+INF = 1000000
+MATE = 100000
+MAX_PLY = 64
+# scores beyond this are mates, stored in the table relative to the node
+MATE_BOUND = MATE - MAX_PLY
+# remaining clock time is spread over this many moves
+MOVES_TO_GO = 30
+# time is checked once per this many nodes
+CHECK_EVERY = 1024
+
+# table entry flags
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# piece-square tables, written as seen from white's side (a8 top left),
+# white piece on sq uses index sq ^ 56 and black piece index sq
+PST = [None,
+    [0,  0,  0,  0,  0,  0,  0,  0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5,  5, 10, 25, 25, 10,  5,  5,
+     0,  0,  0, 20, 20,  0,  0,  0,
+     5, -5,-10,  0,  0,-10, -5,  5,
+     5, 10, 10,-20,-20, 10, 10,  5,
+     0,  0,  0,  0,  0,  0,  0,  0],
+    [-50,-40,-30,-30,-30,-30,-40,-50,
+     -40,-20,  0,  0,  0,  0,-20,-40,
+     -30,  0, 10, 15, 15, 10,  0,-30,
+     -30,  5, 15, 20, 20, 15,  5,-30,
+     -30,  0, 15, 20, 20, 15,  0,-30,
+     -30,  5, 10, 15, 15, 10,  5,-30,
+     -40,-20,  0,  5,  5,  0,-20,-40,
+     -50,-40,-30,-30,-30,-30,-40,-50],
+    [-20,-10,-10,-10,-10,-10,-10,-20,
+     -10,  0,  0,  0,  0,  0,  0,-10,
+     -10,  0,  5, 10, 10,  5,  0,-10,
+     -10,  5,  5, 10, 10,  5,  5,-10,
+     -10,  0, 10, 10, 10, 10,  0,-10,
+     -10, 10, 10, 10, 10, 10, 10,-10,
+     -10,  5,  0,  0,  0,  0,  5,-10,
+     -20,-10,-10,-10,-10,-10,-10,-20],
+    [0,  0,  0,  0,  0,  0,  0,  0,
+     5, 10, 10, 10, 10, 10, 10,  5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     0,  0,  0,  5,  5,  0,  0,  0],
+    [-20,-10,-10, -5, -5,-10,-10,-20,
+     -10,  0,  0,  0,  0,  0,  0,-10,
+     -10,  0,  5,  5,  5,  5,  0,-10,
+      -5,  0,  5,  5,  5,  5,  0, -5,
+       0,  0,  5,  5,  5,  5,  0, -5,
+     -10,  5,  5,  5,  5,  5,  0,-10,
+     -10,  0,  5,  0,  0,  0,  0,-10,
+     -20,-10,-10, -5, -5,-10,-10,-20],
+    [-30,-40,-40,-50,-50,-40,-40,-30,
+     -30,-40,-40,-50,-50,-40,-40,-30,
+     -30,-40,-40,-50,-50,-40,-40,-30,
+     -30,-40,-40,-50,-50,-40,-40,-30,
+     -20,-30,-30,-40,-40,-30,-30,-20,
+     -10,-20,-20,-20,-20,-20,-20,-10,
+      20, 20,  0,  0,  0,  0, 20, 20,
+      20, 30, 10,  0,  0, 10, 30, 20],
+]
+# SCORES[color][kind][sq] -> material and placement bonus, white positive
+SCORES = [[None] + [[VALUES[kind] + PST[kind][sq ^ 56] for sq in range(64)] for kind in range(1, 7)],
+          [None] + [[-VALUES[kind] - PST[kind][sq] for sq in range(64)] for kind in range(1, 7)]]
+
+
+class _Timeout(Exception):
+    pass
+
+
+def evaluate(pos: Position) -> int:
+    # static score in centipawns from the side to move's view
+    score = 0
+    for sq, code in enumerate(pos.squares):
+        if code:
+            score += SCORES[code >> 3][code & 7][sq]
+    return score if pos.turn == WHITE else -score
+
+def time_budget(remaining: float) -> float:
+    # seconds to think given the seconds left on the engine's clock
+    return max(remaining / MOVES_TO_GO, 0.05)
+
+
+class Engine:
+    def __init__(self, table_size: int = consts.ENGINE_TT_SIZE, workers: int = 1, opening: book.Book = None,
+                 tables: tablebase.Tablebase = None):
+        self.table_size = table_size
+        self.table = ttable.TranspositionTable(table_size)
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.nodes = 0
+        self.deadline = 0.0
+        self.stopped = False
+        self.best_move = 0
+        # root moves being searched and (move, score, depth) of finished iterations
+        self.root = []
+        self.iterations = []
+        # background search, result is (position hash, move)
+        self.thread = None
+        self.result = None
+        # worker processes, created on the first parallel search,
+        # cancel is shared with them so stop reaches their searches
+        self.workers = max(workers, 1)
+        self.pool = None
+        self.cancel = None
+        # opening book and endgame tables consulted before searching
+        self.book = opening
+        self.tablebase = tables
+
+    def search(self, pos: Position, seconds: float, depth: int = MAX_PLY, moves: list[int] = None) -> tuple[int | None, int, int]:
+        """
+        Searches pos for at most seconds, deepening one ply at a time.
+        Returns (best move, score, depth of the last finished iteration),
+        move is None if there are no legal moves and depth 0 for book
+        and tablebase moves.
+        If moves are given, only those are searched at the root
+        """
+        pos = pos.copy()
+        legal = pos.legal_moves()
+        if not legal:
+            return None, 0, 0
+        if self.book is not None and moves is None and (move := self.book.choose(pos)) is not None:
+            self.nodes = 0
+            return move, 0, 0
+        if self.tablebase is not None and moves is None and (found := self.tablebase.probe(pos)) is not None:
+            if (move := self.tablebase.best_move(pos)) is not None:
+                result, plies = found
+                self.nodes = 0
+                return move, result * (MATE - plies), 0
+        if self.workers > 1 and moves is None:
+            return self._split(pos, legal, seconds, depth)
+        self.root = moves or legal
+        self.deadline = time.perf_counter() + seconds
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.iterations = []
+        best = (self.root[0], 0, 0)
+        for iteration in range(1, min(depth, MAX_PLY - 1) + 1):
+            try:
+                score = self._negamax(pos, iteration, -INF, INF, 0)
+            except _Timeout:
+                break
+            best = (self.best_move, score, iteration)
+            self.iterations.append(best)
+            # only one move or a forced mate, deeper search won't change it,
+            # a share of the root keeps going so it can be compared with others
+            if len(legal) == 1 or abs(score) >= MATE_BOUND and moves is None:
+                break
+        return best
+
+    def _split(self, pos: Position, moves: list[int], seconds: float, depth: int) -> tuple[int, int, int]:
+        """
+        Deals root moves round-robin to worker processes.
+        Their results are compared at the deepest iteration all of them finished
+        """
+        if self.pool is None:
+            self.cancel = multiprocessing.Event()
+            self.pool = ProcessPoolExecutor(self.workers, initializer = _init_worker, initargs = (self.cancel, self.table_size))
+        moves = self._order(pos, moves, 0, 0)
+        futures = [self.pool.submit(_search_share, pos, moves[i::self.workers], seconds, depth)
+                   for i in range(min(self.workers, len(moves)))]
+        results = [future.result() for future in futures]
+        self.nodes = sum(nodes for _, nodes in results)
+        finished = min(len(iterations) for iterations, _ in results)
+        if not finished:
+            return moves[0], 0, 0
+        return max((iterations[finished - 1] for iterations, _ in results), key = lambda best: best[1])
+
+    def close(self):
+        # shuts worker processes down, they are started again when needed
+        self.stop()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def think(self, pos: Position, seconds: float):
+        # starts searching pos in the background, see result
+        self.stop()
+        self.result = None
+        self.thread = threading.Thread(target = self._think, args = (pos.copy(), seconds), daemon = True)
+        self.thread.start()
+
+    def _think(self, pos: Position, seconds: float):
+        move, _, _ = self.search(pos, seconds)
+        self.result = (pos.hash, move)
+
+    def thinking(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self):
+        # interrupts background search, its result is dropped
+        if self.thread:
+            self.stopped = True
+            if self.cancel is not None:
+                self.cancel.set()
+            self.thread.join()
+            self.thread = None
+            self.stopped = False
+            if self.cancel is not None:
+                self.cancel.clear()
+        self.result = None
+
+    def _check_time(self):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0 and (self.stopped or time.perf_counter() > self.deadline
+                                              or self.cancel is not None and self.cancel.is_set()):
+            raise _Timeout
+
+    def _negamax(self, pos: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._check_time()
+        if ply and pos.halfmove >= 100:
+            return 0
+        checked = pos.in_check()
+        # don't stop searching in the middle of a check
+        if checked and ply < MAX_PLY // 2:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiesce(pos, alpha, beta, ply)
+
+        tt_move = 0
+        if (entry := self.table.probe(pos.hash)) is not None:
+            entry_depth, flag, score, tt_move = entry
+            if ply and entry_depth >= depth:
+                score = _from_table(score, ply)
+                if (flag == EXACT or flag == LOWER and score >= beta
+                        or flag == UPPER and score <= alpha):
+                    return score
+
+        moves = self.root if ply == 0 else pos.legal_moves()
+        if not moves:
+            return -MATE + ply if checked else 0
+
+        best_score, best_move, flag = -INF, 0, UPPER
+        for move in self._order(pos, moves, tt_move, ply):
+            pos.make_move(move)
+            score = -self._negamax(pos, depth - 1, -beta, -alpha, ply + 1)
+            pos.unmake_move()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha, flag = score, EXACT
+                    if ply == 0:
+                        self.best_move = move
+                    if alpha >= beta:
+                        flag = LOWER
+                        if not pos.squares[move_to(move)] and move not in self.killers[ply]:
+                            self.killers[ply] = [move, self.killers[ply][0]]
+                        break
+        self.table.store(pos.hash, (depth, flag, _to_table(best_score, ply), best_move), depth)
+        return best_score
+
+    def _quiesce(self, pos: Position, alpha: int, beta: int, ply: int) -> int:
+        # only captures and promotions are searched, standing pat is allowed
+        self._check_time()
+        stand = evaluate(pos)
+        if stand >= beta:
+            return stand
+        alpha = max(alpha, stand)
+
+        captures = list(pos.generate((CAPTURES,)))
+        for move in self._order(pos, captures, 0, ply):
+            pos.make_move(move)
+            score = -self._quiesce(pos, -beta, -alpha, ply + 1)
+            pos.unmake_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _order(self, pos: Position, moves: list[int], tt_move: int, ply: int) -> list[int]:
+        """
+        Table move first, then captures and promotions by MVV-LVA,
+        killer moves and quiet moves last
+        """
+        killers = self.killers[ply] if ply < MAX_PLY else ()
+        squares = pos.squares
+
+        def key(move: int) -> int:
+            if move == tt_move:
+                return 100000
+            victim = squares[move_to(move)]
+            promotion = move_promotion(move)
+            if victim or promotion:
+                attacker = kind_of(squares[move_from(move)])
+                return 10000 + 10 * VALUES[kind_of(victim) if victim else PAWN] + VALUES[promotion] - attacker
+            if move in killers:
+                return 5000 - killers.index(move)
+            return 0
+        return sorted(moves, key = key, reverse = True)
+
+
+def _to_table(score: int, ply: int) -> int:
+    # mate scores are stored as distance from this node, not from the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def _from_table(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+# engine of a worker process, keeps its table between searches
+_worker = None
+
+def _init_worker(cancel, table_size: int):
+    global _worker
+    _worker = Engine(table_size)
+    _worker.cancel = cancel
+
+def _search_share(pos: Position, moves: list[int], seconds: float, depth: int) -> tuple[list, int]:
+    _worker.search(pos, seconds, depth, moves)
+    return _worker.iterations, _worker.nodes
+
+def main():
+    parser = argparse.ArgumentParser(description = "Search a position and report nodes per second")
+    parser.add_argument("--fen", default = START_FEN, help = "position to search (default: start position)")
+    parser.add_argument("-t", "--seconds", type = float, default = 5.0, help = "time per search")
+    parser.add_argument("-d", "--depth", type = int, default = MAX_PLY, help = "maximal depth")
+    parser.add_argument("-w", "--workers", type = int, nargs = "+", default = [1], help = "worker counts to compare")
+    parser.add_argument("--book", help = "opening book to answer from")
+    parser.add_argument("--tablebase", help = "directory of endgame tables to answer from")
+    args = parser.parse_args()
+    opening = book.Book(args.book) if args.book else None
+    tables = tablebase.Tablebase(args.tablebase) if args.tablebase else None
+
+    print(f"{'workers':>8}{'move':>8}{'score':>8}{'depth':>7}{'nodes':>11}{'seconds':>9}{'nps':>9}")
+    for workers in args.workers:
+        engine = Engine(workers = workers, opening = opening, tables = tables)
+        if workers > 1:
+            # start the processes before the clock runs
+            engine.search(Position.from_fen(args.fen), 0.01, 1)
+        start = time.perf_counter()
+        move, score, depth = engine.search(Position.from_fen(args.fen), args.seconds, args.depth)
+        seconds = time.perf_counter() - start
+        print(f"{workers:>8}{uci(move) if move else '-':>8}{score:>8}{depth if depth else 'book':>7}{engine.nodes:>11}{seconds:>9.2f}{int(engine.nodes / seconds) if seconds else 0:>9}")
+        engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Vectorized static evaluation of batches of positions with NumPy.
+
+A batch is an array of bitboards of shape (n, 2, 7), indexed like
+Position.pieces, and an array of n sides to move. Material and
+piece-square scores (the same tables as engine.py) come from one product
+of the unpacked bitboards with a weight array, mobility from shifting
+the bitboards of every position at once, so scoring costs a few NumPy
+calls per batch instead of a Python loop per piece.
+
+FENs are encoded without building positions: placement fields are
+expanded to one byte per square and turned into bitboards with
+np.packbits for the whole batch. Batches meant to be
+scored repeatedly (training sets, analysis dumps) can be saved with
+np.save and loaded back without parsing.
+
+Usage:
+    python evaluation.py positions.fen        score one FEN per line
+    python evaluation.py --fen "<FEN>"        score every move of a position
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import engine
+from bitboard import FULL, FILE_A
+from position import Position, WHITE, KNIGHT, BISHOP, ROOK, QUEEN, KING, uci
+
+# centipawns per square a piece attacks that isn't taken by its own side
+MOBILITY = {KNIGHT: 4, BISHOP: 3, ROOK: 2, QUEEN: 1}
+# positions scored at a time
+CHUNK = 1024
+
+# material and placement score of every byte of a bitboard:
+# BYTE_SCORES[color][kind][byte index][byte value], white positive
+_bits = (np.arange(256)[:, None] >> np.arange(8) & 1).astype(np.int32)
+BYTE_SCORES = np.zeros((2, 7, 8, 256), dtype = np.int32)
+for _color in range(2):
+    for _kind in range(1, 7):
+        BYTE_SCORES[_color, _kind] = np.array(engine.SCORES[_color][_kind], dtype = np.int32).reshape(8, 8) @ _bits.T
+# offset of every (color, kind, byte index) in the flattened table
+_BYTE_OFFSETS = np.arange(2 * 7 * 8, dtype = np.intp) * 256
+
+# FEN placement with digits expanded to "1"s has 8 bytes per rank and a "/" after each but the last
+_RANK_ENDS = np.arange(8, 71, 9)
+# column of every square (a1 = 0) in an expanded placement without its "/"s
+_SQUARE_COLUMNS = np.array([8 * (7 - sq // 8) + sq % 8 for sq in range(64)])
+# byte -> plane of (color, kind) flattened like Position.pieces, 0 for an empty square, 255 if invalid
+_PLANES = np.full(256, 255, dtype = np.uint8)
+_PLANES[ord("1")] = 0
+for _kind, _letter in enumerate("pnbrqk", 1):
+    _PLANES[ord(_letter.upper())] = _kind
+    _PLANES[ord(_letter)] = 7 + _kind
+
+
+def _masks(*files) -> np.uint64:
+    # every square off the given files
+    bb = 0
+    for file in files:
+        bb |= FILE_A << file
+    return np.uint64(~bb & FULL)
+
+# (shift, mask of squares a shifted piece can land on), positive shifts go up the board
+STRAIGHT = ((1, _masks(0)), (-1, _masks(7)), (8, _masks()), (-8, _masks()))
+DIAGONAL = ((9, _masks(0)), (7, _masks(7)), (-7, _masks(0)), (-9, _masks(7)))
+KNIGHT_STEPS = ((17, _masks(0)), (15, _masks(7)), (10, _masks(0, 1)), (6, _masks(6, 7)),
+                (-6, _masks(0, 1)), (-10, _masks(6, 7)), (-15, _masks(0)), (-17, _masks(7)))
+
+
+def _rays(steps):
+    # left shifts, right shifts and masks of steps as arrays, so all of them are taken at once
+    return (np.array([max(step, 0) for step, _ in steps], dtype = np.uint64),
+            np.array([max(-step, 0) for step, _ in steps], dtype = np.uint64),
+            np.array([mask for _, mask in steps], dtype = np.uint64))
+
+# every slider ray as (kind, direction)
+SLIDES = [(ROOK, step) for step in STRAIGHT] + [(BISHOP, step) for step in DIAGONAL] + \
+         [(QUEEN, step) for step in STRAIGHT + DIAGONAL]
+_SLIDE_KINDS = np.array([kind for kind, _ in SLIDES])
+_SLIDE_WEIGHTS = np.array([MOBILITY[kind] for kind, _ in SLIDES], dtype = np.int32)
+_SLIDE_RAYS = _rays([step for _, step in SLIDES])
+_KNIGHT_RAYS = _rays(KNIGHT_STEPS)
+_ONE = np.uint64(1)
+
+
+def _shift(bb: np.ndarray, rays) -> np.ndarray:
+    left, right, mask = rays
+    return (bb << left >> right) & mask
+
+def encode(positions) -> tuple[np.ndarray, np.ndarray]:
+    # (bitboards, sides to move) of a sequence of positions
+    positions = list(positions)
+    boards = np.array([pos.pieces for pos in positions], dtype = np.uint64).reshape(len(positions), 2, 7)
+    turns = np.array([pos.turn for pos in positions], dtype = np.uint8)
+    return boards, turns
+
+def from_fens(fens) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (bitboards, sides to move) of FENs parsed straight into arrays.
+    Only placement and side to move are read. Raises ValueError for a
+    malformed placement or a side that doesn't have exactly one king
+    """
+    fens = list(fens)
+    fields = [fen.split(None, 2) for fen in fens]
+    for fen, field in zip(fens, fields):
+        if len(field) < 2 or field[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+    # digits are expanded in all placements at once, each one takes 71 bytes and a newline after that
+    placements = "".join([field[0] + "\n" for field in fields])
+    for empty in range(8, 1, -1):
+        placements = placements.replace(str(empty), "1" * empty)
+    if len(placements) != 72 * len(fields):
+        bad = next(index for index, placement in enumerate(placements.split("\n")) if len(placement) != 71)
+        raise ValueError(f"Invalid FEN: {fens[bad]!r}")
+    ranks = np.frombuffer(placements.encode("ascii", "replace"), dtype = np.uint8).reshape(len(fields), 72)
+    planes = _PLANES[np.delete(ranks[:, :71], _RANK_ENDS, axis = 1)][:, _SQUARE_COLUMNS]
+    # a short placement and a long one can add up to the right length, newlines catch them
+    bad = ((ranks[:, 71] != ord("\n")) | (ranks[:, _RANK_ENDS] != ord("/")).any(axis = 1) | (planes == 255).any(axis = 1) |
+           ((planes == KING).sum(axis = 1) != 1) | ((planes == 7 + KING).sum(axis = 1) != 1))
+    if bad.any():
+        raise ValueError(f"Invalid FEN: {fens[int(np.argmax(bad))]!r}")
+
+    # one bit per square of every plane, packed into bitboards
+    onehot = planes[:, None, :] == np.arange(14, dtype = np.uint8)[None, :, None]
+    boards = np.packbits(onehot.reshape(-1, 64), axis = 1, bitorder = "little").view("<u8").astype(np.uint64)
+    boards = boards.reshape(len(fields), 2, 7)
+    boards[:, :, 0] = 0
+    turns = np.array([field[1] == "b" for field in fields], dtype = np.uint8)
+    return boards, turns
+
+def expand(pos: Position) -> tuple[list[int], np.ndarray, np.ndarray]:
+    # legal moves of pos and the batch of positions they lead to
+    moves = pos.legal_moves()
+    children = []
+    for move in moves:
+        pos.make_move(move)
+        children.append(pos.pieces[0] + pos.pieces[1])
+        pos.unmake_move()
+    boards = np.array(children, dtype = np.uint64).reshape(len(moves), 2, 7)
+    return moves, boards, np.full(len(moves), pos.turn ^ 1, dtype = np.uint8)
+
+def material(boards: np.ndarray) -> np.ndarray:
+    # material and piece-square score of every position looked up a byte at a time, white positive
+    values = boards.astype("<u8").view(np.uint8).reshape(len(boards), -1)
+    return BYTE_SCORES.reshape(-1)[values + _BYTE_OFFSETS].sum(axis = 1, dtype = np.int32)
+
+def mobility(boards: np.ndarray) -> np.ndarray:
+    """
+    Mobility score of every position, white positive. Rays of all sliders
+    of the batch are filled with Kogge-Stone steps (1, 2 and 4 squares).
+    Rays going the same way never cross, so counting the filled squares
+    counts the moves of every slider
+    """
+    own = np.bitwise_or.reduce(boards, axis = 2)[:, :, None]
+    empty = ~(own[:, 0] | own[:, 1])[:, None]
+
+    knights = _shift(boards[:, :, KNIGHT, None], _KNIGHT_RAYS) & ~own
+    counts = MOBILITY[KNIGHT] * np.bitwise_count(knights).sum(axis = 2, dtype = np.int32)
+
+    left, right, mask = _SLIDE_RAYS
+    filled = boards[:, :, _SLIDE_KINDS]
+    # squares a ray can pass, masked so shifts don't wrap around the board
+    passable = empty & mask
+    for _ in range(3):
+        filled = filled | passable & (filled << left >> right)
+        passable = passable & (passable << left >> right)
+        left, right = left << _ONE, right << _ONE
+    reached = _shift(filled, _SLIDE_RAYS) & ~own
+    counts += np.bitwise_count(reached).astype(np.int32) @ _SLIDE_WEIGHTS
+    return counts[:, 0] - counts[:, 1]
+
+def evaluate(boards: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    # static score of every position in centipawns from its side to move's view
+    scores = np.empty(len(boards), dtype = np.int32)
+    # chunks keep the temporary arrays in cache
+    for start in range(0, len(boards), CHUNK):
+        chunk = boards[start:start + CHUNK]
+        scores[start:start + CHUNK] = material(chunk) + mobility(chunk)
+    return np.where(turns == WHITE, scores, -scores)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Score positions with the vectorized evaluation")
+    parser.add_argument("files", nargs = "*", help = "files with one FEN per line, - reads stdin")
+    parser.add_argument("--fen", help = "score every legal move of this position instead")
+    parser.add_argument("-q", "--quiet", action = "store_true", help = "only report throughput")
+    args = parser.parse_args()
+
+    if args.fen:
+        pos = Position.from_fen(args.fen)
+        moves, boards, turns = expand(pos)
+        # children are scored from the opponent's view
+        scores = -evaluate(boards, turns)
+        for index in np.argsort(-scores, kind = "stable"):
+            print(f"{uci(moves[index]):<8}{scores[index]}")
+        return
+
+    fens = []
+    for path in args.files or ["-"]:
+        file = sys.stdin if path == "-" else open(path)
+        with file:
+            fens.extend(line.strip() for line in file if line.strip())
+    start = time.perf_counter()
+    boards, turns = from_fens(fens)
+    encoded = time.perf_counter()
+    scores = evaluate(boards, turns)
+    scored = time.perf_counter()
+    if not args.quiet:
+        for fen, score in zip(fens, scores):
+            print(f"{score:>7} {fen}")
+    print(f"{len(fens)} positions, encoded in {encoded - start:.3f}s, scored in {scored - encoded:.3f}s "
+          f"({int(len(fens) / (scored - encoded) / 1000) if scored > encoded else 0} positions/ms)", file = sys.stderr)
+
+if __name__ == "__main__":
+    main()
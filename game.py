@@ -3,13 +3,29 @@ Chess game built in Python 3.11 using Pygame 2.1.2. and sockets.
 Game is playable with either opponent on the same PC or via local Wi-Fi network.
 
 Modules:
+*analysis.py - analyzes stored games in parallel, writes JSON lines
+*bitboard.py - contains bitboard tables and attack lookups
+*book.py - contains memory-mapped opening book and its builder
 *button.py - contains Button class that handles button behavour
 *client.py - contains Client class that handles data exchange with server
+*clocks.py - contains Clock class, chess clocks with increment and delay
 *consts.py - contains all constants used in-game
+*draws.py - draw rules: repetition, fifty-move rule, insufficient material
+*engine.py - contains Engine class, the computer opponent
+*evaluation.py - scores batches of positions with NumPy
 *figure.py - contains a class for each of chess pieces
-*game.py - main script that runs most of GUI and state-changing
+*game.py - main script that runs GUI on top of the match
+*match.py - contains headless Match class with rules and game state
+*pgn.py - reads, writes and validates games in PGN
 *pieces.py - initialieses all chess pieces
+*position.py - contains bitboard position and move generator
+*renderbench.py - times redraws of the game headless
 *server.py - handles data exchange between clients
+*sprites.py - caches scaled piece images shared by all pieces
+*tablebase.py - generates and probes endgame tablebases
+*timings.py - timing history and regression check shared by the benchmarks
+*ttable.py - contains transposition table keyed by position hash
+*zobrist.py - contains Zobrist keys used for position hashing
 *images - folder containing all images for chess pieces
 *Helvetica.otf - font file
 """
@@ -21,17 +37,34 @@ except:
     os.system("pip install pygame")
     import pygame as pg
     
+import argparse
+import os
 import consts
 import pieces
 import client
-from figure import Figure, Queen
+import clocks
+import bitboard
+import position
+import ttable
+import match
+import engine
+import book
+import tablebase
+from figure import Figure
 import button
+import sprites
 
 class Game:
-    def __init__(self):
+    def __init__(self, fen: str = position.START_FEN, workers: int = consts.ENGINE_WORKERS,
+                 control: tuple[float] = (consts.TIME, consts.INCREMENT, consts.DELAY), headless: bool = False):
         """
-        Initialising main surfaces, fonts, buttons and variables
+        Initialising main surfaces, fonts, buttons and variables,
+        every match starts from the position given by fen and
+        the computer opponent searches with given number of processes.
+        Headless game draws to SDL's dummy video driver, no window is opened
         """
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
         pg.init()
 
         self.screen = pg.display.set_mode((consts.WIDTH + 2 * consts.MARGIN, consts.HEIGHT + 2*consts.HEADER))
@@ -45,27 +78,46 @@ class Game:
         self.board_overlay.set_alpha(200)
 
         pg.display.set_caption("Chess")
-        pg.display.set_icon(pg.image.load("images\KNIGHT_WHITE.png").convert_alpha())
-
-        # importing list of initialised pieces
-        self.pieces = pieces.get_pieces()
+        pg.display.set_icon(pg.image.load("images/KNIGHT_WHITE.png").convert_alpha())
+
+        # starting position of every match
+        self.fen = fen
+        # check and mate status of positions seen so far,
+        # kept between matches so rematches and replays hit the cache
+        self.table = ttable.TranspositionTable(consts.TT_SIZE)
+        # endgame tables, used by the match and the computer opponent
+        self.tablebase = tablebase.Tablebase(consts.TABLEBASE_DIR) if os.path.isdir(consts.TABLEBASE_DIR) else None
+        self.match = match.Match.from_fen(fen, self.table, self.tablebase)
+        # importing list of initialised pieces, they only mirror self.match
+        self.pieces = pieces.from_position(self.match.position)
         # dict containing list of eaten pieces from both black and white player
         self.eaten = {"white": [], "black": []}
-        self.timer = {"white": consts.TIME, "black": consts.TIME}
+        # color -> (captured symbols and material lead, rendered strip of eaten pieces)
+        self.strips = {}
+        # (seconds, increment, delay) of both clocks
+        self.control = control
+        self.clock = clocks.Clock(*control)
         # active_piece is the currently selected piece
         # lastPiece is the piece that played the last move
         self.active_piece: Figure = None
         self.lastPiece: Figure = None
-        self.turn = "white"
+        self.turn = self.match.turn
+        # computer opponent and the color it plays, None if there is none
+        opening = book.Book(consts.BOOK_FILE) if os.path.exists(consts.BOOK_FILE) else None
+        self.engine = engine.Engine(workers = workers, opening = opening, tables = self.tablebase)
+        self.computer: str = None
 
         self.mouse_pos = (0,0)
+        # window rect -> what it showed in the last presented frame
+        self.frame = {}
         # initialisation of all the buttons
         self.QuitWaitBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 4 * consts.END_GAME_MENU_SIZE // 5, "Quit")
         self.RematchBtn = button.Button(consts.END_GAME_MENU_SIZE // 4, 6 * consts.END_GAME_MENU_SIZE // 8, "Rematch")
         self.MainMenuBtn = button.Button(3 * consts.END_GAME_MENU_SIZE // 4, 6 * consts.END_GAME_MENU_SIZE // 8, "Main Menu")
         self.SettingsBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 4 * consts.END_GAME_MENU_SIZE // 5, "Settings")
-        self.OpponentBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 2 * consts.END_GAME_MENU_SIZE // 5, "Opponent")
-        self.OnlineBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 3 * consts.END_GAME_MENU_SIZE // 5, "Online")
+        self.OpponentBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 7 * consts.END_GAME_MENU_SIZE // 20, "Opponent")
+        self.ComputerBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 10 * consts.END_GAME_MENU_SIZE // 20, "Computer")
+        self.OnlineBtn = button.Button(consts.END_GAME_MENU_SIZE // 2, 13 * consts.END_GAME_MENU_SIZE // 20, "Online")
         self.AcceptBtn = button.Button(3 * consts.END_GAME_MENU_SIZE // 4, 6 * consts.END_GAME_MENU_SIZE // 8, "Accept")
         self.RefuseBtn = button.Button(consts.END_GAME_MENU_SIZE // 4, 6 * consts.END_GAME_MENU_SIZE // 8, "Refuse")
         self.SurrenderWhiteBtn = button.Button(consts.TIMER_X-3*consts.BTN_WIDTH//8 - consts.TIMER_BUFFER, consts.TIMER_W_Y + consts.TIMER_HEIGHT//2, "Surrender", 
@@ -86,22 +138,38 @@ class Game:
         self.font = pg.font.Font("Helvetica.otf", consts.FONT_SIZE)
         self.FONT = pg.font.Font("Helvetica.otf", consts.BIG_FONT_SIZE)
 
+        # state flags, the game starts in the main menu
+        self.MainMenu = True
+        self.WaitMenu = False
+        self.DrawMenu = False
+        self.singleplayer = False
+        self.online = False
+        self.onlineRematch = False
+        self.end = False
+        self.drawn = False
+        self.discSign = False
+        self.rematch_requested = False
+        self.draw_requested = False
+        self.connError = False
+
+        self.client = client.Client()
+
     def reset(self):
         """
         After finished match, resets all variables to default
         """
-        self.pieces = pieces.get_pieces()
-        self.eaten = {"white": [], "black": []}
-        self.timer = {"white": consts.TIME, "black": consts.TIME}
+        self.clock = clocks.Clock(*self.control)
+        self.engine.stop()
         self.active_piece: Figure = None
-        self.lastPiece: Figure = None
         self.end: bool = False
         self.drawn: bool = False
-        self.turn: str = "white"
-        self.SurrenderWhiteBtn.active: int = 1
-        self.SurrenderBlackBtn.active: int = 0
-        self.DrawBlackBtn.active: int = 0
-        self.DrawWhiteBtn.active: int = 1
+        self.update(setup = True)
+        self.SurrenderWhiteBtn.active: int = int(self.turn == "white")
+        self.SurrenderBlackBtn.active: int = int(self.turn == "black")
+        self.DrawBlackBtn.active: int = self.SurrenderBlackBtn.active
+        self.DrawWhiteBtn.active: int = self.SurrenderWhiteBtn.active
+        if self.computer:
+            self.set_buttons()
 
     def redraw(self):
         self.screen.fill(consts.BG_COLOR)
@@ -113,25 +181,14 @@ class Game:
         if self.singleplayer or self.client.color == "black":    
             self.SurrenderBlackBtn.draw(self.screen, self.mouse_pos)
             self.DrawBlackBtn.draw(self.screen, self.mouse_pos)
-        #drawing tiles
-        for i in range(8):
-            for j in range(8):
-                color = consts.LIGHT_TILE_COLOR if (i + j) % 2 == 0 else consts.DARK_TILE_COLOR
-                pg.draw.rect(self.board, color, (i * consts.SIDE, j * consts.SIDE, consts.SIDE, consts.SIDE))
-
-        #indexing tiles
-        for i, letter in enumerate("abcdefgh"):
-            letter_image = self.font.render(letter, True, consts.DARK_TILE_COLOR if i % 2 else consts.LIGHT_TILE_COLOR)
-            self.board.blit(letter_image, ((i + 1) * consts.SIDE - letter_image.get_width() - consts.LETTER_BUFFER, consts.HEIGHT - letter_image.get_height() - consts.LETTER_BUFFER))
-
-        for i, num in enumerate("12345678"):
-            num_image = self.font.render(num, True, consts.DARK_TILE_COLOR if i % 2 else consts.LIGHT_TILE_COLOR)
-            self.board.blit(num_image, (consts.LETTER_BUFFER, consts.LETTER_BUFFER + consts.HEIGHT - (i + 1) * consts.SIDE))
-
-        #drawing eaten pieces
-        for color in self.eaten:
-            for order, piece in enumerate(self.eaten[color]):
-                piece.draw_eaten(self.screen, order)
+        #drawing tiles and their labels, rendered once
+        self.board.blit(sprites.background(self.font), (0, 0))
+
+        #drawing eaten pieces, white ones above the board
+        strip = self.eaten_strip("white")
+        self.screen.blit(strip, (consts.MARGIN, consts.HEADER // 2 - strip.get_height() // 2))
+        strip = self.eaten_strip("black")
+        self.screen.blit(strip, (consts.MARGIN, consts.HEIGHT + 3 * consts.HEADER // 2 - strip.get_height() // 2))
 
         #shading previous move
         if self.lastPiece:
@@ -171,36 +228,24 @@ class Game:
         run = True
         clock = pg.time.Clock()
 
-        # state flags
-        self.MainMenu = True
-        self.WaitMenu = False
-        self.DrawMenu = False
-        self.singleplayer = False
-        self.online = False
-        self.onlineRematch = False
-        self.end = False
-        self.drawn = False
-        self.discSign = False
-        self.rematch_requested = False
-        self.draw_requested = False
-        self.connError = False
-
-        self.client = client.Client()
-
         while run:
             clock.tick(consts.FPS)
-            self.redraw()
-            pg.display.update()
+            # frames where nothing changed are neither drawn nor presented
+            if dirty := self.dirty_rects():
+                self.redraw()
+                pg.display.update(dirty)
             self.mouse_pos = pg.mouse.get_pos()
 
-            # handling clock ticking and time-out
-            if self.timer[self.turn] == 0:
+            # handling clock ticking and time-out, clocks only run during play
+            if self.clock.flagged(self.turn):
                 self.end = True
                 self.singleplayer = False
                 self.online = False
             elif (self.singleplayer or 
                     self.client.ready and not self.end and not self.DrawMenu):
-                self.timer[self.turn] -= 1
+                self.clock.start(self.turn)
+            else:
+                self.clock.pause()
 
             # [online] if data received is tuple of 2 integers,
             # it is mouse pos of click from other player
@@ -259,6 +304,9 @@ class Game:
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     run = False
+                elif event.type == pg.VIDEOEXPOSE:
+                    # window contents were lost, present everything again
+                    self.frame = {}
                 elif event.type == pg.MOUSEBUTTONDOWN:
                     if self.singleplayer: self.play()
                     elif self.MainMenu: self.main_menu_backend()
@@ -269,121 +317,196 @@ class Game:
                 elif event.type == pg.KEYDOWN:
                     if event.key == pg.K_ESCAPE:
                         run = False
+                    # takebacks only make sense on the same PC
+                    elif event.key == pg.K_BACKSPACE and self.singleplayer:
+                        self.takeback()
+
+            # [computer] engine searches in its own thread,
+            # its move is played on the first frame after it's done
+            if self.singleplayer and self.turn == self.computer and not self.end:
+                self.computer_move()
 
         # before closing program disconnect from server 
         if self.client.ready or self.rematch_requested:
             self.client.disconnect()
+        self.engine.close()
         pg.quit()
         quit()
 
-    def get_taken_tiles(self, color):
+    def frame_state(self) -> dict[tuple, tuple]:
+        """
+        Returns {window rect: what is drawn there} for every region
+        that can change: squares, eaten pieces, clocks, buttons and menus
+        """
+        state = {}
+        pieces_on = {piece.tile: (piece.symb, piece.color, getattr(piece, "checked", False)) for piece in self.pieces}
+        highlighted = (self.lastPiece.tile, self.lastPiece.lastMove) if self.lastPiece else ()
+        circles = ()
+        if (self.active_piece and not self.online) or (self.online and self.active_piece and self.turn == self.client.color):
+            circles = self.active_piece.where_to_go
+        for tile in bitboard.TILES:
+            x = consts.MARGIN + (ord(tile[0]) - ord("a")) * consts.SIDE
+            y = consts.HEADER + (8 - int(tile[1])) * consts.SIDE
+            state[(x, y, consts.SIDE, consts.SIDE)] = (pieces_on.get(tile), tile in highlighted, tile in circles)
+
+        width = consts.WIDTH + 2 * consts.MARGIN
+        lead = self.material_lead()
+        state[(0, 0, width, consts.HEADER)] = (tuple(piece.symb for piece in self.eaten["white"]), lead)
+        state[(0, consts.HEADER + consts.HEIGHT, width, consts.HEADER)] = (tuple(piece.symb for piece in self.eaten["black"]), lead)
+        state[(consts.TIMER_X, consts.TIMER_B_Y, consts.TIMER_WIDTH, consts.TIMER_HEIGHT)] = self.get_clock("black")
+        state[(consts.TIMER_X, consts.TIMER_W_Y, consts.TIMER_WIDTH, consts.TIMER_HEIGHT)] = self.get_clock("white")
+        for color, buttons in (("white", (self.SurrenderWhiteBtn, self.DrawWhiteBtn)), ("black", (self.SurrenderBlackBtn, self.DrawBlackBtn))):
+            shown = self.singleplayer or self.client.color == color
+            for btn in buttons:
+                state[(btn.abs_x, btn.abs_y, btn.width, btn.height)] = (shown, btn.isOver(self.mouse_pos))
+
+        # menus cover the whole window, any change in them redraws it
+        menu = None
+        if self.end or (self.online and not self.client.ready) or self.MainMenu or self.DrawMenu:
+            buttons = (self.QuitWaitBtn, self.RematchBtn, self.MainMenuBtn, self.SettingsBtn, self.OpponentBtn,
+                       self.ComputerBtn, self.OnlineBtn, self.AcceptBtn, self.RefuseBtn)
+            menu = (self.end, self.online, self.client.ready, self.MainMenu, self.DrawMenu, self.drawn, self.turn,
+                    self.match.draw, self.onlineRematch, self.rematch_requested, self.draw_requested,
+                    self.discSign, self.connError, tuple(btn.isOver(self.mouse_pos) for btn in buttons))
+        state[(0, 0, width, consts.HEIGHT + 2 * consts.HEADER)] = menu
+        return state
+
+    def dirty_rects(self) -> list[tuple]:
         """
-        Returns list of tiles taken by both players, 
-        doesn't count king tile if king color and color argument don't match
+        Returns window rects that changed since the last presented frame
+        and remembers the current one, empty if nothing changed
         """
-        return {piece.tile : piece.color for piece in self.pieces if (piece.symb != "K") or (piece.symb == "K" and piece.color in color)}
+        state = self.frame_state()
+        dirty = [rect for rect, shown in state.items() if rect not in self.frame or self.frame[rect] != shown]
+        self.frame = state
+        return dirty
 
-    def get_attacked(self, color):
+    def update(self , setup = False):
         """
-        Returns a list of tiles occupiable by opponent,
-        based on color
+        Clears walkable tiles of pieces, they are only worked out
+        for the selected piece, see find_active_piece
+
+        If setup flag is True, a new match is started from self.fen
         """
-        attacked = set()
+        if setup:
+            self.match = match.Match.from_fen(self.fen, self.table, self.tablebase)
+            self.turn = self.match.turn
+            self.sync_pieces()
         for piece in self.pieces:
-            if piece.color != color:
-                #pawn attacking pattern
-                if piece.symb == "": attacked.update(piece.attack())
-                #king attacking pattern
-                elif piece.symb == "K": attacked.update(piece.moving_pattern())
-                #attacking pattern of other pieces
-                else: attacked.update(piece.where_to_go)
-        return list(attacked)
-    
-    def get_defended(self, color):
+            piece.where_to_go = []
+
+    def make_move(self, move: int):
         """
-        Returns a list of player's figures that are defended
-        by player's other figures
+        Plays move in the match, rebuilds pieces from it
+        and passes the turn to the other player
         """
-        defended = set()
-        for piece in self.pieces:
-            if piece.defending and piece.color != color:
-                defended.update(piece.defending)
+        self.match.make_move(move)
+        self.sync_pieces()
 
-        return list(defended)
+        self.clock.press()
+        self.turn = "black" if self.turn == "white" else "white"
+        self.set_buttons()
+        self.update()
 
-    def update(self , setup = False):
-        """
-        Updates walkable tiles, en passant and casteling possibilites
-        as well as eaten pieces
+        self.isChecked()
+        self.end = self.isMated() or self.isDrawn()
 
-        If setup flag is True, dict eaten won't be traversed
+    def computer_move(self):
         """
-        for piece in self.pieces:
-            piece.block_tiles(self.get_taken_tiles(piece.color))
-            if piece.symb == "" and self.lastPiece and not setup:
-                piece.en_passant(self.lastPiece.tile, self.lastPiece.lastMove)
-
-        for ind in self.get_kings():
-            self.pieces[ind].forbidden_tiles(self.get_attacked(self.pieces[ind].color), self.get_defended(self.pieces[ind].color))
-            self.tryCasteling(self.pieces[ind])
+        Starts the engine on the current position unless it's
+        already thinking, plays its move once the search is done
+        """
+        if self.engine.thinking():
+            return
+        if self.engine.result and self.engine.result[0] == self.match.position.hash:
+            move = self.engine.result[1]
+            self.engine.result = None
+            self.active_piece = None
+            self.make_move(move)
+            self.check_end()
+        else:
+            self.engine.think(self.match.position, engine.time_budget(self.clock.left(self.turn)))
 
-        if setup == True: return
+    def takeback(self):
+        """
+        Takes back the last played move by unmaking it
+        on the position, nothing is copied.
+        Against the computer its reply is taken back as well
+        """
+        self.engine.stop()
+        plies = 2 if self.computer and self.turn != self.computer else 1
+        if not self.match.takeback():
+            return
+        if plies == 2:
+            self.match.takeback()
+        self.sync_pieces()
+
+        self.active_piece = None
+        self.turn = self.match.turn
+        self.set_buttons()
+        self.update()
+        self.isChecked()
+
+    def sync_pieces(self):
+        """
+        Rebuilds pieces and eaten pieces from the match,
+        piece that played the last move becomes lastPiece
+        """
+        pos = self.match.position
+        self.pieces = pieces.from_position(pos)
+        self.eaten = {color: [pieces.get_piece(0, i, kind) for kind in self.match.captured[i]]
+                      for i, color in enumerate(position.COLORS)}
+        self.lastPiece = None
+        if (move := pos.last_move()) is not None:
+            for piece in self.pieces:
+                if piece.tile == bitboard.tile(position.move_to(move)):
+                    piece.lastMove = bitboard.tile(position.move_from(move))
+                    self.lastPiece = piece
+
+    def material_lead(self) -> int:
+        # material of white minus material of black, promotions included
+        return sum(piece.value if piece.color == "white" else -piece.value for piece in self.pieces)
+
+    def eaten_strip(self, color: str) -> pg.Surface:
+        """
+        Returns eaten pieces of color in one surface, followed by the lead
+        of the player who took them. It's only rendered again when one of them changes
+        """
+        lead = self.material_lead() * (-1 if color == "white" else 1)
+        key = (tuple(piece.symb for piece in self.eaten[color]), lead)
+        if (cached := self.strips.get(color)) and cached[0] == key:
+            return cached[1]
+
+        text = self.sfont.render(f"+{lead}", True, consts.LIGHT_TILE_COLOR) if lead > 0 else None
+        width = len(self.eaten[color]) * consts.EATEN_SIZE + (text.get_width() + consts.TIMER_BUFFER if text else 0)
+        height = max(consts.EATEN_SIZE, text.get_height() if text else 0)
+        strip = pg.Surface((max(width, 1), height), pg.SRCALPHA)
+        for order, piece in enumerate(self.eaten[color]):
+            strip.blit(sprites.thumbnail(piece.symb, piece.color), (order * consts.EATEN_SIZE, (height - consts.EATEN_SIZE) // 2))
+        if text:
+            strip.blit(text, (width - text.get_width(), (height - text.get_height()) // 2))
+        self.strips[color] = (key, strip)
+        return strip
+
+    def result(self) -> str:
+        """
+        Returns result of the match in PGN notation, games that ended
+        in a draw, by resignation or on time included. Loser of a finished
+        game that isn't drawn is the player on turn, like in the end menu
+        """
+        if not self.end:
+            return "*"
+        if self.drawn:
+            return "1/2-1/2"
+        return "0-1" if self.turn == "white" else "1-0"
 
-        for piece in self.pieces:
-            if piece.tile == self.active_piece.tile and piece.color != self.active_piece.color:
-
-                self.eaten[piece.color].append(piece)
-                self.pieces.remove(piece)
-
-                self.eaten[piece.color] = sorted(self.eaten[piece.color], key = lambda piece: piece.symb)
-                self.eaten[piece.color] = sorted(self.eaten[piece.color], key = lambda piece: piece.value, reverse = True )
-                break
-
-    def save_king(self, ind: int):
-        if self.active_piece.color == self.pieces[ind].color:
-            #deep copying current state of variables
-            locked_pieces = self.pieces.copy()
-            locked_eaten_white = self.eaten["white"].copy()
-            locked_eaten_black = self.eaten["black"].copy()
-            possible_moves = []
-
-            #establishing local variables
-            locked = self.active_piece.where_to_go
-            currentTile = self.active_piece.tile
-            lastTile = self.active_piece.lastMove
-            moved = self.active_piece.moved
-
-            for tile in locked:
-                
-                self.active_piece.move(tile)
-                self.update()
-
-                for ind in self.get_kings():
-                    if self.pieces[ind].color == self.active_piece.color:
-                        break
-
-                # if particular move doesn't cause check,
-                # it's added to the possible_moves list
-                # that eventually becomes viable tiles list
-                if not self.pieces[ind].check(self.get_attacked(self.pieces[ind].color)):
-                    possible_moves.append(tile)
-                
-            # restarting variables to default after search
-            self.active_piece.move(currentTile)
-            self.pieces = locked_pieces.copy()
-            self.active_piece.moved = moved
-            self.active_piece.lastMove = lastTile
-            self.update()
-
-            self.eaten["white"] = locked_eaten_white.copy()
-            self.eaten["black"] = locked_eaten_black.copy()
-            self.active_piece.where_to_go = possible_moves.copy()
+    def pgn(self, headers: dict = None) -> str:
+        # PGN of the played game with its actual result
+        return self.match.pgn(headers, self.result())
 
     def isChecked(self):
         for i in self.get_kings():
-            self.pieces[i].checked = self.pieces[i].check(self.get_attacked(self.pieces[i].color))
-            if self.active_piece:
-                self.save_king(i)
+            self.pieces[i].checked = self.match.checked and self.pieces[i].color == self.turn
 
     def PosToTile(self, pos: tuple[int]):
         """
@@ -399,50 +522,49 @@ class Game:
         return None
 
     def isMated(self):
-        kings = self.get_kings()
-        # finds endangered king
-        for i in kings:
-            if self.pieces[i].color == self.turn:
-                break
-        # if king isn't checked it can't be mated
-        if not self.pieces[i].checked: return False
-        #checks if saving king is possible by any other piece
-        for piece in self.pieces:
-            if piece.color == self.pieces[i].color:
-                self.active_piece = piece
-                self.save_king(i)
-                if self.active_piece.where_to_go:
-                    return False
+        # checked king without a single legal move of its side
+        if not self.match.mated:
+            return False
         self.singleplayer = True
         return True
 
+    def isDrawn(self):
+        # stalemate, repetition, fifty-move rule, insufficient material or a drawn tablebase ending, found by the match
+        if self.match.draw is None:
+            return False
+        self.drawn = True
+        return True
+
     def find_active_piece(self, pos) -> Figure | None:
         """
         Given (x, y) coordinates pos of mouse click,
-        Returns an active piece or None if click was off-board
+        Returns an active piece or None if click was off-board.
+        Walkable tiles of the returned piece are filled from the match
         """
         for piece in self.pieces:
-            if piece.isOverFig(pos) and piece.color == self.turn: return piece
+            if piece.isOverFig(pos) and piece.color == self.turn:
+                piece.where_to_go = self.match.targets(piece.tile)
+                return piece
+
+    def get_move(self, piece: Figure, tile: str) -> int:
+        # encodes moving piece to tile, pawns always promote to queen
+        promotion = position.QUEEN if piece.symb == "" and tile[1] in "18" else 0
+        return position.make(bitboard.square(piece.tile), bitboard.square(tile), promotion)
 
     def get_kings(self) -> list[Figure]:
         # returns list of king indeces
         return [i for i in range(len(self.pieces)) if self.pieces[i].symb == "K"]
 
-    def get_rooks(self, color):
-        # returns list of rook indeces
-        return [piece for piece in self.pieces if piece.symb == "R" and piece.color == color]
-
-    def tryCasteling(self, king: Figure):
-        # checks if casteling is viable move
-        if not king.checked:
-            king.ableToCastle(self.get_rooks(king.color), self.get_attacked(king.color), self.get_taken_tiles(("white", "black")))
-
     def set_buttons(self):
         """
         After every turn, update which 
         surrender and draw buttons are accessible
         """
-        if self.singleplayer:
+        if self.computer:
+            # only the player's buttons are ever accessible
+            self.SurrenderWhiteBtn.active = self.DrawWhiteBtn.active = int(self.computer == "black")
+            self.SurrenderBlackBtn.active = self.DrawBlackBtn.active = int(self.computer == "white")
+        elif self.singleplayer:
             self.SurrenderBlackBtn.active = (self.SurrenderBlackBtn.active + 1) % 2
             self.SurrenderWhiteBtn.active = (self.SurrenderBlackBtn.active + 1) % 2
             self.DrawBlackBtn.active = self.SurrenderBlackBtn.active
@@ -499,29 +621,19 @@ class Game:
         elif self.active_piece:
             tile = self.PosToTile(self.mouse_pos)
             if tile in self.active_piece.where_to_go:
-                if self.active_piece.symb == "K": 
-                    self.active_piece.move(tile, self.get_rooks(self.active_piece.color))
-                elif self.active_piece.symb == "":
-                    self.active_piece.move(tile, self.pieces, self.eaten, self.lastPiece)
-                else: 
-                    self.active_piece.move(tile)
-                self.lastPiece = self.active_piece
-                
-                self.turn = "black" if self.turn == "white" else "white"
-                self.set_buttons()
-                self.update()
-
-                self.isChecked()
-                self.end = self.isMated()
+                self.make_move(self.get_move(self.active_piece, tile))
 
             self.active_piece = None
-        else:
+        # computer's pieces can't be selected
+        elif self.turn != self.computer:
             self.active_piece = self.find_active_piece(self.mouse_pos)
-            if self.active_piece: 
-                self.isChecked()
 
+        self.check_end()
+
+    def check_end(self):
         # Check if opponent was mated
         if self.end:
+            self.engine.stop()
             self.singleplayer = False
             self.online = False
             self.SurrenderBlackBtn.active = False
@@ -555,6 +667,7 @@ class Game:
             self.menu.blit(sign2, (X, Y))
 
         self.OpponentBtn.draw(self.menu, self.mouse_pos)
+        self.ComputerBtn.draw(self.menu, self.mouse_pos)
         self.OnlineBtn.draw(self.menu, self.mouse_pos)
         self.SettingsBtn.draw(self.menu, self.mouse_pos)
 
@@ -562,6 +675,17 @@ class Game:
 
     def main_menu_backend(self):
         if self.OpponentBtn.isOver(self.mouse_pos):
+            self.computer = None
+            self.reset()
+            self.singleplayer = True
+            self.MainMenu = False
+            self.online = False
+            self.setup = True
+            self.discSign = False
+            self.connError = False
+        elif self.ComputerBtn.isOver(self.mouse_pos):
+            # player takes white, computer answers with black
+            self.computer = "black"
             self.reset()
             self.singleplayer = True
             self.MainMenu = False
@@ -569,6 +693,7 @@ class Game:
             self.setup = True
             self.discSign = False
             self.connError = False
+            self.set_buttons()
         elif self.OnlineBtn.isOver(self.mouse_pos):
             self.client.connect()
             self.discSign = False
@@ -596,6 +721,10 @@ class Game:
             X = consts.END_GAME_MENU_SIZE // 2 - sign.get_width() // 2
             Y = consts.END_GAME_MENU_SIZE // 5 - sign.get_height() // 2
             self.menu.blit(sign, (X, Y))
+            # draws by rule tell which one
+            if self.match.draw:
+                rule = self.font.render(f"by {self.match.draw}", True, consts.GRAY)
+                self.menu.blit(rule, ((consts.END_GAME_MENU_SIZE - rule.get_width()) // 2, 3 * consts.END_GAME_MENU_SIZE // 10 - rule.get_height() // 2))
         # smo won, smo lost sign
         else:
             loser = self.FONT.render(f"{self.turn[0].upper() + self.turn[1:]} has lost!", True, consts.GRAY)
@@ -636,6 +765,8 @@ class Game:
                 self.setup = True
         elif self.MainMenuBtn.isOver(self.mouse_pos):
             self.client.disconnect()
+            self.engine.stop()
+            self.computer = None
             self.MainMenu = True
             self.singleplayer = False
             self.end = False
@@ -660,20 +791,23 @@ class Game:
             self.client.disconnect()
 
     def get_clock(self, color):
-        if (minutes := self.timer[color] // (60 * consts.FPS)) > 0:
-            return str(minutes) + ":" + str((self.timer[color] % (60 * consts.FPS)) // consts.FPS).zfill(2)
+        # visible value of a clock, tenths of a second are shown in the last minute
+        tenths = int(self.clock.left(color) * 10)
+        if (minutes := tenths // 600) > 0:
+            return f"{minutes}:{tenths // 10 % 60:02}"
         else:
-            return str((self.timer[color] % (60 * consts.FPS)) // consts.FPS) + "." + str((self.timer[color] % consts.FPS) // 10)
+            return f"{tenths // 10}.{tenths % 10}"
 
     def draw_clocks(self):
-        pg.draw.rect(self.screen, consts.LIGHT_TILE_COLOR, (consts.TIMER_X, consts.TIMER_B_Y, consts.TIMER_WIDTH, consts.TIMER_HEIGHT))
-        pg.draw.rect(self.screen, consts.LIGHT_TILE_COLOR, (consts.TIMER_X, consts.TIMER_W_Y, consts.TIMER_WIDTH, consts.TIMER_HEIGHT))
-
-        tw = self.sfont.render(self.get_clock("white"), 1, consts.GRAY)
-        tb = self.sfont.render(self.get_clock("black"), 1, consts.GRAY)
-
-        self.screen.blit(tw, (consts.TIMER_X + consts.TIMER_WIDTH - tw.get_width() - consts.TIMER_BUFFER, consts.TIMER_W_Y))
-        self.screen.blit(tb, (consts.TIMER_X + consts.TIMER_WIDTH - tb.get_width() - consts.TIMER_BUFFER, consts.TIMER_B_Y))
+        # digits are cached glyphs, right aligned in the clock
+        glyphs = sprites.glyphs(self.sfont, consts.GRAY)
+        for color, y in (("white", consts.TIMER_W_Y), ("black", consts.TIMER_B_Y)):
+            pg.draw.rect(self.screen, consts.LIGHT_TILE_COLOR, (consts.TIMER_X, y, consts.TIMER_WIDTH, consts.TIMER_HEIGHT))
+            images = [glyphs[char] for char in self.get_clock(color)]
+            x = consts.TIMER_X + consts.TIMER_WIDTH - consts.TIMER_BUFFER - sum(image.get_width() for image in images)
+            for image in images:
+                self.screen.blit(image, (x, y))
+                x += image.get_width()
 
     def draw_draw_menu(self):
         self.menu.fill(consts.WHITE)
@@ -734,6 +868,17 @@ class Game:
                 self.DrawMenu = False
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description = "Chess game")
+    parser.add_argument("fen", nargs = "*", help = "FEN of the starting position (default: initial position)")
+    parser.add_argument("-w", "--workers", type = int, default = consts.ENGINE_WORKERS, help = "processes the computer opponent searches with")
+    parser.add_argument("-t", "--time", type = float, default = consts.TIME / 60, help = "minutes on each clock")
+    parser.add_argument("-i", "--increment", type = float, default = consts.INCREMENT, help = "seconds added after every move")
+    parser.add_argument("-d", "--delay", type = float, default = consts.DELAY, help = "seconds of every move that aren't charged")
+    args = parser.parse_args()
+    try:
+        position.Position.from_fen(" ".join(args.fen) or position.START_FEN)
+    except ValueError as error:
+        parser.error(str(error))
+    game = Game(" ".join(args.fen) or position.START_FEN, args.workers, (args.time * 60, args.increment, args.delay))
     game.run() 
         
@@ -0,0 +1,113 @@
+"""
+Headless rules core of a chess match.
+
+Keeps the position, captured pieces, check/mate status and draws by
+rule or by endgame tablebase of a game and has no pygame dependency, so the server, batch tools and tests can
+play and validate games without a display. The GUI only renders it.
+"""
+
+import consts
+import bitboard
+import draws
+import pgn
+import tablebase
+import ttable
+from position import Position, COLORS, START_FEN
+
+
+class Match:
+    def __init__(self, pos: Position = None, table: ttable.TranspositionTable = None,
+                 tables: tablebase.Tablebase = None):
+        self.position = pos if pos is not None else Position.from_fen(START_FEN)
+        # check and mate status of positions seen so far,
+        # can be shared between matches so rematches hit the cache
+        self.table = table if table is not None else ttable.TranspositionTable(consts.TT_SIZE)
+        # endgame tables, they give the result of positions they cover
+        self.tablebase = tables
+        # captured[color] -> kinds of captured pieces of that color, most valuable first
+        self.captured = [[], []]
+        # position hash -> number of times it was reached, for repetitions
+        self.seen = {self.position.hash: 1}
+        self.update()
+
+    @classmethod
+    def from_fen(cls, fen: str, table: ttable.TranspositionTable = None, tables: tablebase.Tablebase = None):
+        return cls(Position.from_fen(fen), table, tables)
+
+    def fen(self) -> str:
+        # snapshot of the current position, enough to resume the match
+        return self.position.fen()
+
+    def result(self) -> str:
+        # result by the rules in PGN notation, "*" while the game goes on
+        if self.mated:
+            return "0-1" if self.turn == "white" else "1-0"
+        return "1/2-1/2" if self.draw else "*"
+
+    def pgn(self, headers: dict = None, result: str = None) -> str:
+        # PGN of the match, result defaults to the one given by the rules
+        return pgn.write_game(self.position, headers, result or self.result())
+
+    @property
+    def turn(self) -> str:
+        return COLORS[self.position.turn]
+
+    def update(self):
+        """
+        Looks up check, mate and stalemate status of the side to move,
+        they are worked out only for positions not seen before and stop
+        at the first legal move. Verdict is (result, plies to mate) from
+        the tablebase or None, positions it covers aren't searched for moves
+        """
+        if (entry := self.table.probe(self.position.hash)) is None:
+            pos = self.position
+            checked = pos.in_check()
+            verdict = self.tablebase.probe(pos) if self.tablebase is not None else None
+            if verdict is None:
+                movable = pos.has_legal_move()
+            elif verdict[0]:
+                # won and lost positions have moves unless the side to move is mated
+                movable = verdict != (-1, 0)
+            else:
+                # drawn ones end the game, only stalemate is told apart
+                movable = checked or pos.has_legal_move()
+            entry = (checked, checked and not movable, not checked and not movable, verdict)
+            self.table.store(pos.hash, entry)
+        self.checked, self.mated, self.stalemated, self.verdict = entry
+        # draws depend on the game history, so they aren't cached
+        self.draw = None
+        if self.stalemated:
+            self.draw = draws.STALEMATE
+        elif not self.mated:
+            self.draw = draws.reason(self.position, self.seen[self.position.hash])
+            if self.draw is None and self.verdict is not None and self.verdict[0] == 0:
+                self.draw = draws.TABLEBASE
+
+    def targets(self, tile: str) -> list[str]:
+        # tiles the piece on tile can legally move to, only that piece's moves are generated
+        return bitboard.tiles(self.position.piece_targets(bitboard.square(tile)))
+
+    def make_move(self, move: int):
+        self.position.make_move(move)
+        if captured := self.position.last_captured():
+            color, kind = captured
+            self.captured[color].append(kind)
+            self.captured[color].sort(reverse = True)
+        self.seen[self.position.hash] = self.seen.get(self.position.hash, 0) + 1
+        self.update()
+
+    def takeback(self) -> bool:
+        """
+        Unmakes the last played move,
+        returns False if there is nothing to take back
+        """
+        if not self.position.stack:
+            return False
+        if (count := self.seen.pop(self.position.hash)) > 1:
+            self.seen[self.position.hash] = count - 1
+        if captured := self.position.last_captured():
+            color, kind = captured
+            self.captured[color].remove(kind)
+        self.position.unmake_move()
+        self.update()
+        return True
@@ -0,0 +1,174 @@
+"""
+Headless perft benchmark and correctness suite for the move generator.
+
+Counts leaf nodes to a given depth for a set of standard positions,
+compares them against known values and reports nodes per second.
+Every run is appended to a history file and compared against earlier
+runs of the same position and depth, so slowdowns show up as regressions.
+Random games from every position are also taken back after exporting
+them as PGN, attacks and legal moves after each takeback have to match
+the ones of the same position built from FEN.
+
+Usage:
+    python perft.py                      run the whole suite at default depths
+    python perft.py -p kiwipete -d 4     one position to a chosen depth
+    python perft.py --fen "<FEN>" -d 3 --divide
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import pgn
+import timings
+from position import Position, uci
+
+HISTORY_FILE = "perft_history.jsonl"
+# random games played from every position by the takeback check, and their length
+TAKEBACK_GAMES = 20
+TAKEBACK_PLIES = 40
+
+# name -> (FEN, default depth, [known node counts for depth 1, 2, ...])
+POSITIONS = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 4,
+              [20, 400, 8902, 197281, 4865609, 119060324]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3,
+                 [48, 2039, 97862, 4085603, 193690690]),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 4,
+                  [14, 191, 2812, 43238, 674624, 11030083]),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3,
+                  [6, 264, 9467, 422333, 15833292]),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3,
+                  [44, 1486, 62379, 2103487, 89941194]),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3,
+                  [46, 2079, 89890, 3894594]),
+    "illegal-ep": ("3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", 4,
+                   [18, 92, 1670, 10138, 185429, 1134888]),
+    "ep-check": ("8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", 4,
+                 [15, 126, 1928, 13931, 206379, 1440467]),
+    "castle-check": ("5k2/8/8/8/8/8/8/4K2R w K - 0 1", 4,
+                     [15, 66, 1198, 6399, 120330, 661072]),
+    "promote-out-of-check": ("2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", 4,
+                             [11, 133, 1442, 19174, 266199, 3821001]),
+    "promote-check": ("4k3/1P6/8/8/8/8/K7/8 w - - 0 1", 5,
+                      [9, 40, 472, 2661, 38983, 217342]),
+    "underpromote-check": ("8/P1k5/K7/8/8/8/8/8 w - - 0 1", 5,
+                           [6, 27, 273, 1329, 18135, 92683]),
+    "discovered-check": ("8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", 3,
+                         [37, 183, 6559, 23527]),
+}
+
+
+def perft(pos: Position, depth: int) -> int:
+    """
+    Returns number of leaf nodes depth plies below pos,
+    last ply is counted without playing the moves
+    """
+    moves = pos.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        pos.make_move(move)
+        nodes += perft(pos, depth - 1)
+        pos.unmake_move()
+    return nodes
+
+def divide(pos: Position, depth: int) -> dict[str, int]:
+    # leaf count below every root move, used to locate generator bugs
+    counts = {}
+    for move in pos.legal_moves():
+        pos.make_move(move)
+        counts[uci(move)] = perft(pos, depth - 1)
+        pos.unmake_move()
+    return counts
+
+def takebacks(fen: str, games: int = TAKEBACK_GAMES, plies: int = TAKEBACK_PLIES) -> tuple[int, int]:
+    """
+    Plays seeded random games from fen, exports each as PGN after every
+    move (which replays it on a copy) and takes the moves back one by one.
+    Returns (takebacks, takebacks after which attack maps or legal moves
+    differ from a position built from the same FEN)
+    """
+    rng = random.Random(fen)
+    checked = bad = 0
+    for _ in range(games):
+        pos = Position.from_fen(fen)
+        for _ in range(plies):
+            if not (moves := pos.legal_moves()):
+                break
+            pos.make_move(rng.choice(moves))
+            pgn.write_game(pos)
+        while pos.stack:
+            pos.unmake_move()
+            checked += 1
+            fresh = Position.from_fen(pos.fen())
+            bad += pos.attack_map != fresh.attack_map or pos.legal_targets() != fresh.legal_targets()
+    return checked, bad
+
+def run(name: str, fen: str, depth: int, expected: int | None) -> dict:
+    pos = Position.from_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(pos, depth)
+    seconds = time.perf_counter() - start
+    return {"position": name, "depth": depth, "nodes": nodes, "expected": expected,
+            "ok": expected is None or nodes == expected,
+            "seconds": round(seconds, 4), "nps": int(nodes / seconds) if seconds else 0}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Perft benchmark and move generator correctness suite")
+    parser.add_argument("-p", "--position", action = "append", choices = POSITIONS, help = "position to run, repeatable (default: all)")
+    parser.add_argument("-d", "--depth", type = int, help = "depth to search (default: per position)")
+    parser.add_argument("--fen", help = "run a custom position instead of the suite")
+    parser.add_argument("--divide", action = "store_true", help = "print node count below every root move")
+    parser.add_argument("--history", default = HISTORY_FILE, help = "timing history file")
+    parser.add_argument("--no-history", action = "store_true", help = "don't read or write timing history")
+    parser.add_argument("--tolerance", type = float, default = 0.15, help = "allowed slowdown before a regression is reported")
+    args = parser.parse_args()
+
+    if args.fen:
+        suite = [("custom", args.fen, args.depth or 3, None)]
+    else:
+        suite = []
+        for name in args.position or POSITIONS:
+            fen, default, counts = POSITIONS[name]
+            depth = args.depth or default
+            suite.append((name, fen, depth, counts[depth - 1] if depth <= len(counts) else None))
+
+    history = [] if args.no_history else timings.load(args.history)
+    failed = False
+    total_nodes, total_seconds = 0, 0.0
+
+    print(f"{'position':<22}{'depth':>6}{'nodes':>12}{'expected':>12}{'seconds':>10}{'nps':>10}")
+    for name, fen, depth, expected in suite:
+        if args.divide:
+            for move, nodes in sorted(divide(Position.from_fen(fen), depth).items()):
+                print(f"  {move}: {nodes}")
+
+        result = run(name, fen, depth, expected)
+        total_nodes += result["nodes"]
+        total_seconds += result["seconds"]
+        status = "" if result["ok"] else "  MISMATCH"
+        if (best := timings.regression(result, history, ("position", "depth"), "nps", args.tolerance)) is not None:
+            status += f"  REGRESSION (best {best} nps)"
+        failed |= not result["ok"]
+
+        print(f"{name:<22}{depth:>6}{result['nodes']:>12}{str(expected or '-'):>12}{result['seconds']:>10.2f}{result['nps']:>10}{status}")
+
+        if not args.no_history:
+            timings.append(args.history, result)
+
+    checked = bad = 0
+    for name, fen, _, _ in suite:
+        counts = takebacks(fen)
+        checked, bad = checked + counts[0], bad + counts[1]
+    print(f"takebacks after PGN export: {checked} checked, {bad} with wrong attacks or legal moves" + ("  MISMATCH" if bad else ""))
+    failed |= bad > 0
+
+    if total_seconds:
+        print(f"total: {total_nodes} nodes in {total_seconds:.2f}s, {int(total_nodes / total_seconds)} nps")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Streaming PGN reader and writer with a bulk validation mode.
+
+Games are read one at a time from any iterable of lines, so archives
+of any size are never loaded into memory. SAN moves are decoded with
+the move generator of position.py, only pieces that can reach the
+destination square are looked at.
+
+Usage:
+    python pgn.py games.pgn [more.pgn ...]     validate every game
+    python pgn.py - < games.pgn                read games from stdin
+"""
+
+import argparse
+import re
+import sys
+import time
+
+import draws
+from bitboard import FULL, bits, square, tile
+from position import (Position, START_FEN, WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                      kind_of, make, move_from, move_to, move_promotion)
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# tags every exported game starts with, in this order
+ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+# exported movetext is wrapped at this many characters
+LINE_LENGTH = 79
+
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# comment, rest-of-line comment, variation bracket or any other token
+TOKEN = re.compile(r"\{[^}]*\}?|;.*|[()]|[^\s{}();]+")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+LETTERS = {KNIGHT: "N", BISHOP: "B", ROOK: "R", QUEEN: "Q", KING: "K"}
+KIND_OF = {letter: kind for kind, letter in LETTERS.items()}
+
+
+def read_games(lines):
+    """
+    Yields (headers, SAN moves, result) for every game in lines.
+    Comments, variations, NAGs and move numbers are skipped
+    """
+    headers, moves = {}, []
+    comment = False
+    depth = 0
+    for line in lines:
+        if comment:
+            if (end := line.find("}")) < 0:
+                continue
+            line = line[end + 1:]
+            comment = False
+        stripped = line.strip()
+        if not stripped or stripped[0] == "%":
+            continue
+        if stripped[0] == "[" and not depth and (tag := TAG.match(stripped)):
+            # tags right after movetext without a result start a new game
+            if moves:
+                yield headers, moves, headers.get("Result", "*")
+                headers, moves = {}, []
+            headers[tag[1]] = tag[2].replace('\\"', '"').replace("\\\\", "\\")
+            continue
+
+        for token in TOKEN.findall(stripped):
+            first = token[0]
+            if first == "{":
+                comment = token[-1] != "}"
+            elif first in ";$!?":
+                continue
+            elif first == "(":
+                depth += 1
+            elif first == ")":
+                depth = max(depth - 1, 0)
+            elif depth:
+                continue
+            elif token in RESULTS:
+                yield headers, moves, token
+                headers, moves = {}, []
+            elif move := MOVE_NUMBER.sub("", token):
+                moves.append(move)
+    if headers or moves:
+        yield headers, moves, headers.get("Result", "*")
+
+def parse_san(pos: Position, san: str) -> int:
+    """
+    Returns the legal move of pos written as san,
+    raises ValueError if there is no such move or it's ambiguous
+    """
+    text = san.rstrip("+#!?")
+    color = pos.turn
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        frm = pos.king_square(color)
+        to = frm + (2 if len(text) == 3 else -2)
+        if pos.targets(frm) >> to & 1:
+            return make(frm, to)
+        raise ValueError(f"Illegal move {san!r} in {pos.fen()}")
+
+    if not (match := SAN.match(text)):
+        raise ValueError(f"Invalid SAN {san!r}")
+    letter, file, rank, to, promotion = match.groups()
+    kind = KIND_OF[letter] if letter else PAWN
+    to = square(to)
+    promotion = KIND_OF[promotion] if promotion else 0
+    if (kind == PAWN and to >> 3 in (0, 7)) != bool(promotion):
+        raise ValueError(f"Invalid promotion {san!r} in {pos.fen()}")
+
+    candidates = []
+    pins = pos.pins()
+    for frm in bits(pos.pieces[color][kind]):
+        if file and tile(frm)[0] != file or rank and tile(frm)[1] != rank:
+            continue
+        if pos.targets(frm) >> to & 1:
+            move = make(frm, to, promotion)
+            if kind == KING or _legal(pos, move, pins):
+                candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move {san!r} in {pos.fen()}")
+    return candidates[0]
+
+def _legal(pos: Position, move: int, pins: dict[int, int]) -> bool:
+    """
+    Returns whether pseudo-legal move doesn't leave own king in check,
+    pins are enough unless the king is already in check or it's en passant
+    """
+    frm, to = move_from(move), move_to(move)
+    if not pos.in_check() and not (to == pos.ep and kind_of(pos.squares[frm]) == PAWN):
+        return pins.get(frm, FULL) >> to & 1 == 1
+    color = pos.turn
+    pos.make_move(move)
+    legal = not pos.in_check(color)
+    pos.unmake_move()
+    return legal
+
+def san(pos: Position, move: int) -> str:
+    # SAN of a legal move of pos, pos is left unchanged
+    frm, to, promotion = move_from(move), move_to(move), move_promotion(move)
+    kind = kind_of(pos.squares[frm])
+    if kind == KING and abs(to - frm) == 2:
+        text = "O-O" if to > frm else "O-O-O"
+    else:
+        capture = pos.squares[to] != 0 or (kind == PAWN and to == pos.ep)
+        if kind == PAWN:
+            text = (tile(frm)[0] + "x" if capture else "") + tile(to)
+            if promotion:
+                text += "=" + LETTERS[promotion]
+        else:
+            rivals = [other for other, targets in pos.legal_targets().items()
+                      if other != frm and kind_of(pos.squares[other]) == kind and targets >> to & 1]
+            prefix = ""
+            if rivals:
+                if all(other & 7 != frm & 7 for other in rivals):
+                    prefix = tile(frm)[0]
+                elif all(other >> 3 != frm >> 3 for other in rivals):
+                    prefix = tile(frm)[1]
+                else:
+                    prefix = tile(frm)
+            text = LETTERS[kind] + prefix + ("x" if capture else "") + tile(to)
+
+    pos.make_move(move)
+    if pos.in_check():
+        text += "+" if pos.has_legal_move() else "#"
+    pos.unmake_move()
+    return text
+
+def replay(headers: dict, moves: list[str]) -> Position:
+    # plays SAN moves from the start position of the game
+    pos = Position.from_fen(headers.get("FEN", START_FEN))
+    for text in moves:
+        pos.make_move(parse_san(pos, text))
+    return pos
+
+def write_game(pos: Position, headers: dict = None, result: str = None) -> str:
+    """
+    Returns PGN of the game that led to pos, moves are taken from its undo stack.
+    Result defaults to the one given by the rules: checkmate, stalemate or
+    a draw of draws.py, "*" otherwise. Resignations, draws by agreement and
+    losses on time have to be passed, see Match.pgn
+    """
+    start = pos.copy()
+    moves, hashes = [], [start.hash]
+    while start.stack:
+        moves.append(start.unmake_move())
+        hashes.append(start.hash)
+    moves.reverse()
+
+    if result is None:
+        result = "*"
+        if not pos.has_legal_move():
+            result = "1/2-1/2" if not pos.in_check() else "0-1" if pos.turn == WHITE else "1-0"
+        elif draws.reason(pos, hashes.count(pos.hash)):
+            result = "1/2-1/2"
+    tags = {"Event": "PyChess game", "Site": "?", "Date": time.strftime("%Y.%m.%d"), "Round": "-",
+            "White": "?", "Black": "?"}
+    tags.update(headers or {})
+    tags["Result"] = result
+    if start.fen() != START_FEN:
+        tags["SetUp"], tags["FEN"] = "1", start.fen()
+
+    tokens = []
+    for move in moves:
+        if start.turn == WHITE or not tokens:
+            tokens.append(f"{start.fullmove}." if start.turn == WHITE else f"{start.fullmove}...")
+        tokens.append(san(start, move))
+        start.make_move(move)
+    tokens.append(result)
+
+    lines, line = [], ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+
+    order = list(ROSTER) + [name for name in tags if name not in ROSTER]
+    escaped = {name: value.replace("\\", "\\\\").replace('"', '\\"') for name, value in tags.items()}
+    return "".join(f'[{name} "{escaped[name]}"]\n' for name in order) + "\n" + "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description = "Validate every game of PGN files with the move generator")
+    parser.add_argument("files", nargs = "+", help = "PGN files, - reads stdin")
+    parser.add_argument("--progress", type = int, default = 10000, help = "report throughput every N games (0 disables)")
+    parser.add_argument("-q", "--quiet", action = "store_true", help = "don't print invalid games")
+    args = parser.parse_args()
+
+    games = invalid = plies = 0
+    start = time.perf_counter()
+
+    def report():
+        seconds = time.perf_counter() - start
+        print(f"{games} games, {invalid} invalid, {plies} moves in {seconds:.2f}s, "
+              f"{int(games / seconds) if seconds else 0} games/s, {int(plies / seconds) if seconds else 0} moves/s",
+              file = sys.stderr)
+
+    for path in args.files:
+        file = sys.stdin if path == "-" else open(path, encoding = "utf-8", errors = "replace")
+        with file:
+            for headers, moves, result in read_games(file):
+                games += 1
+                try:
+                    replay(headers, moves)
+                except ValueError as error:
+                    invalid += 1
+                    if not args.quiet:
+                        print(f"{path}: game {games} ({headers.get('White', '?')} - {headers.get('Black', '?')}): {error}")
+                plies += len(moves)
+                if args.progress and games % args.progress == 0:
+                    report()
+
+    report()
+    sys.exit(1 if invalid else 0)
+
+if __name__ == "__main__":
+    main()
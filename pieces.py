@@ -1,34 +1,14 @@
 import figure
+import position
+from bitboard import tile
 
-def get_pieces() -> list[figure.Figure]:
-    Rook1 = figure.Rook("a8", "black")
-    Rook2 = figure.Rook("h8", "black")
-    Knight1 = figure.Knight("b8", "black")
-    Knight2 = figure.Knight("g8", "black")
-    Bishop1 = figure.Bishop("c8", "black")
-    Bishop2 = figure.Bishop("f8", "black")
-    King = figure.King("e8", "black")
-    Queen = figure.Queen("d8", "black")
+# piece kind -> Figure class
+FIGURES = {position.PAWN: figure.Pawn, position.KNIGHT: figure.Knight, position.BISHOP: figure.Bishop,
+           position.ROOK: figure.Rook, position.QUEEN: figure.Queen, position.KING: figure.King}
 
-    pieces = [Rook1, Rook2, Bishop1, Bishop2, Knight1, Knight2, King, Queen]
+def get_piece(sq: int, color: int, kind: int) -> figure.Figure:
+    return FIGURES[kind](tile(sq), position.COLORS[color])
 
-    for i in "abcdefgh":
-        Pawn = figure.Pawn(f"{i}7", "black")
-        pieces.append(Pawn)
-
-    Rook1 = figure.Rook("a1", "white")
-    Rook2 = figure.Rook("h1", "white")
-    Knight1 = figure.Knight("b1", "white")
-    Knight2 = figure.Knight("g1", "white")
-    Bishop1 = figure.Bishop("c1", "white")
-    Bishop2 = figure.Bishop("f1", "white")
-    King = figure.King("e1", "white")
-    Queen = figure.Queen("d1", "white")
-
-    pieces += [Rook1, Rook2, Bishop1, Bishop2, Knight1, Knight2, King, Queen]
-
-    for i in "abcdefgh":
-        Pawn = figure.Pawn(f"{i}2", "white")
-        pieces.append(Pawn)
-
-    return pieces
\ No newline at end of file
+def from_position(pos: position.Position) -> list[figure.Figure]:
+    # figures standing on the board of pos
+    return [get_piece(sq, position.color_of(code), position.kind_of(code)) for sq, code in enumerate(pos.squares) if code]
@@ -0,0 +1,576 @@
+"""
+Bitboard representation of a chess position and its move generator.
+
+A position keeps one bitboard per (color, piece kind), an occupancy
+bitboard per color and a 64-byte square -> piece code board. Attacks of every piece
+and their union per color are kept up to date incrementally, a move only
+recomputes the pieces it touched and the sliders whose rays crossed them.
+Moves are small ints: from square in bits 0-5, to square in bits 6-11,
+promotion kind in bits 12-14. Piece codes are small ints too: kind in
+bits 0-2 and color in bit 3, 0 is an empty square.
+"""
+
+from array import array
+
+from zobrist import PIECE_KEYS, CASTLING_KEYS, EP_KEYS, TURN_KEY
+from bitboard import (FULL, BETWEEN, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, RANK_1, RANK_8,
+                      bishop_attacks, rook_attacks, queen_attacks, bits, lsb, square, tile, SQUARES)
+
+WHITE, BLACK = 0, 1
+COLORS = ("white", "black")
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+# Figure.symb -> piece kind
+KINDS = {"": PAWN, "N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+SYMBOLS = {kind: symb for symb, kind in KINDS.items()}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# castling rights bits
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+# right -> (king from, king to, rook from, rook to)
+CASTLES = {
+    WHITE_KINGSIDE: (square("e1"), square("g1"), square("h1"), square("f1")),
+    WHITE_QUEENSIDE: (square("e1"), square("c1"), square("a1"), square("d1")),
+    BLACK_KINGSIDE: (square("e8"), square("g8"), square("h8"), square("f8")),
+    BLACK_QUEENSIDE: (square("e8"), square("c8"), square("a8"), square("d8")),
+}
+# CASTLING_MASK[sq] -> rights that survive a move from or to sq
+CASTLING_MASK = [15] * 64
+for right, (king, _, rook, _) in CASTLES.items():
+    CASTLING_MASK[king] &= ~right
+    CASTLING_MASK[rook] &= ~right
+# king destination -> castling right
+CASTLE_TARGETS = {to: right for right, (_, to, _, _) in CASTLES.items()}
+
+# stages of generate: captures and queen promotions, quiet checks, other quiet moves
+CAPTURES, CHECKS, QUIETS = range(3)
+STAGES = (CAPTURES, CHECKS, QUIETS)
+
+
+def piece(color: int, kind: int) -> int:
+    # code of a piece as stored in Position.squares
+    return color << 3 | kind
+
+def color_of(code: int) -> int:
+    return code >> 3
+
+def kind_of(code: int) -> int:
+    return code & 7
+
+def make(frm: int, to: int, promotion: int = 0) -> int:
+    return frm | (to << 6) | (promotion << 12)
+
+def move_from(move: int) -> int:
+    return move & 63
+
+def move_to(move: int) -> int:
+    return (move >> 6) & 63
+
+def move_promotion(move: int) -> int:
+    return move >> 12
+
+def uci(move: int) -> str:
+    # move in long algebraic notation, e.g. "e7e8q"
+    promotion = "nbrq"[move_promotion(move) - KNIGHT] if move_promotion(move) else ""
+    return tile(move_from(move)) + tile(move_to(move)) + promotion
+
+
+class Position:
+    __slots__ = ("pieces", "occupied", "squares", "turn", "castling", "ep", "attacks_from",
+                 "attack_map", "halfmove", "fullmove", "hash", "stack")
+
+    def __init__(self):
+        # pieces[color][kind] -> bitboard, index 0 is unused
+        self.pieces = [[0] * 7, [0] * 7]
+        self.occupied = [0, 0]
+        # squares[sq] -> piece code, 0 if empty
+        self.squares = bytearray(64)
+        self.turn = WHITE
+        self.castling = 0
+        # en passant target square or None
+        self.ep = None
+        # attacks_from[sq] -> squares attacked by the piece on sq
+        self.attacks_from = array("Q", bytes(512))
+        # attack_map[color] -> every square attacked (or defended) by color
+        self.attack_map = [0, 0]
+        # plies since the last capture or pawn move
+        self.halfmove = 0
+        # number of the current full move, incremented after black's move
+        self.fullmove = 1
+        # Zobrist hash, updated with every change
+        self.hash = 0
+        # undo records of played moves, see make_move
+        self.stack = []
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """
+        Builds a position from FEN, halfmove clock
+        and fullmove number may be omitted.
+        Raises ValueError if any field is malformed or the position can't
+        arise in a game: a side without exactly one king, pawns on the first
+        or last rank, the side not to move in check, castling rights without
+        their king and rook or an en passant square without the pushed pawn
+        """
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6 or len(fields[0].split("/")) != 8:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        pos = cls()
+        for rank, row in enumerate(fields[0].split("/")):
+            file = 0
+            for char in row:
+                if char in "12345678":
+                    file += int(char)
+                elif char in "pnbrqkPNBRQK" and file < 8:
+                    pos.put(8 * (7 - rank) + file, WHITE if char.isupper() else BLACK, "pnbrqk".index(char.lower()) + 1)
+                    file += 1
+                else:
+                    raise ValueError(f"Invalid FEN, bad rank {row!r}: {fen!r}")
+            if file != 8:
+                raise ValueError(f"Invalid FEN, rank {row!r} doesn't have 8 squares: {fen!r}")
+        if pos.pieces[WHITE][KING].bit_count() != 1 or pos.pieces[BLACK][KING].bit_count() != 1:
+            raise ValueError(f"Invalid FEN, each side needs exactly one king: {fen!r}")
+        if (pos.pieces[WHITE][PAWN] | pos.pieces[BLACK][PAWN]) & (RANK_1 | RANK_8):
+            raise ValueError(f"Invalid FEN, pawns on the first or last rank: {fen!r}")
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN, bad side to move {fields[1]!r}: {fen!r}")
+        pos.turn = WHITE if fields[1] == "w" else BLACK
+        if fields[2] != "-" and (not set(fields[2]) <= set("KQkq") or len(set(fields[2])) != len(fields[2])):
+            raise ValueError(f"Invalid FEN, bad castling rights {fields[2]!r}: {fen!r}")
+        for char, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+            if char in fields[2]:
+                king, _, rook, _ = CASTLES[right]
+                color = WHITE if char.isupper() else BLACK
+                if pos.squares[king] != piece(color, KING) or pos.squares[rook] != piece(color, ROOK):
+                    raise ValueError(f"Invalid FEN, castling right {char} without its king and rook: {fen!r}")
+                pos.castling |= right
+        # en passant square is empty and behind a pawn the opponent just pushed from an empty square
+        if fields[3] != "-":
+            if fields[3] not in SQUARES or fields[3][1] != ("6" if pos.turn == WHITE else "3"):
+                raise ValueError(f"Invalid FEN, bad en passant square {fields[3]!r}: {fen!r}")
+            ep, step = square(fields[3]), -8 if pos.turn == WHITE else 8
+            if pos.squares[ep] or pos.squares[ep - step] or pos.squares[ep + step] != piece(pos.turn ^ 1, PAWN):
+                raise ValueError(f"Invalid FEN, no pawn was just pushed past {fields[3]!r}: {fen!r}")
+            pos.ep = ep
+        try:
+            pos.halfmove = int(fields[4]) if len(fields) > 4 else 0
+            pos.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Invalid FEN, bad move counters: {fen!r}") from None
+        if pos.halfmove < 0 or pos.fullmove < 1:
+            raise ValueError(f"Invalid FEN, bad move counters: {fen!r}")
+        pos.refresh(pos.occupancy())
+        if pos.in_check(pos.turn ^ 1):
+            raise ValueError(f"Invalid FEN, the side not to move is in check: {fen!r}")
+        pos.hash = pos.compute_hash()
+        return pos
+
+    def fen(self) -> str:
+        # FEN of the position, en passant square is given after every double push
+        rows = []
+        for rank in range(7, -1, -1):
+            row, empty = "", 0
+            for sq in range(8 * rank, 8 * rank + 8):
+                if not (code := self.squares[sq]):
+                    empty += 1
+                    continue
+                char = "pnbrqk"[kind_of(code) - 1]
+                row += (str(empty) if empty else "") + (char.upper() if color_of(code) == WHITE else char)
+                empty = 0
+            rows.append(row + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE))
+                           if self.castling & right) or "-"
+        ep = tile(self.ep) if self.ep is not None else "-"
+        return f"{'/'.join(rows)} {'wb'[self.turn]} {castling} {ep} {self.halfmove} {self.fullmove}"
+
+    def copy(self):
+        pos = Position.__new__(Position)
+        pos.pieces = [self.pieces[WHITE].copy(), self.pieces[BLACK].copy()]
+        pos.occupied = self.occupied.copy()
+        pos.squares = self.squares[:]
+        pos.turn = self.turn
+        pos.castling = self.castling
+        pos.ep = self.ep
+        pos.attacks_from = self.attacks_from[:]
+        pos.attack_map = self.attack_map.copy()
+        pos.halfmove = self.halfmove
+        pos.fullmove = self.fullmove
+        pos.hash = self.hash
+        pos.stack = self.stack.copy()
+        return pos
+
+    # put and remove don't touch the attack maps,
+    # refresh has to be called once all squares are changed
+    def put(self, sq: int, color: int, kind: int):
+        self.pieces[color][kind] |= 1 << sq
+        self.occupied[color] |= 1 << sq
+        self.squares[sq] = color << 3 | kind
+        self.hash ^= PIECE_KEYS[color][kind][sq]
+
+    def remove(self, sq: int):
+        code = self.squares[sq]
+        color, kind = code >> 3, code & 7
+        self.pieces[color][kind] &= ~(1 << sq)
+        self.occupied[color] &= ~(1 << sq)
+        self.squares[sq] = 0
+        self.hash ^= PIECE_KEYS[color][kind][sq]
+
+    def _ep_key(self) -> int:
+        # en passant only counts if the side to move can actually capture
+        if self.ep is not None and PAWN_ATTACKS[self.turn ^ 1][self.ep] & self.pieces[self.turn][PAWN]:
+            return EP_KEYS[self.ep & 7]
+        return 0
+
+    def compute_hash(self) -> int:
+        # hash from scratch, make_move keeps it updated incrementally
+        key = CASTLING_KEYS[self.castling] ^ self._ep_key()
+        if self.turn == BLACK:
+            key ^= TURN_KEY
+        for sq, code in enumerate(self.squares):
+            if code:
+                key ^= PIECE_KEYS[code >> 3][code & 7][sq]
+        return key
+
+    def refresh(self, changed: int) -> list[tuple[int, int]]:
+        """
+        Recomputes attacks of pieces standing on changed squares
+        and of sliders whose rays went through them,
+        then rebuilds the attack map of both colors.
+        Returns (square, previous attacks) of every recomputed square
+        """
+        occ = self.occupancy()
+        dirty = changed
+        for color in (WHITE, BLACK):
+            pieces = self.pieces[color]
+            for sq in bits(pieces[BISHOP] | pieces[ROOK] | pieces[QUEEN]):
+                if self.attacks_from[sq] & changed:
+                    dirty |= 1 << sq
+
+        saved = []
+        for sq in bits(dirty):
+            saved.append((sq, self.attacks_from[sq]))
+            self.attacks_from[sq] = self.attacks(sq, occ) if self.squares[sq] else 0
+
+        # unions are cheap ORs of cached boards, no attacks are generated here
+        for color in (WHITE, BLACK):
+            attacked = 0
+            for sq in bits(self.occupied[color]):
+                attacked |= self.attacks_from[sq]
+            self.attack_map[color] = attacked
+        return saved
+
+    def make_move(self, move: int):
+        """
+        Plays move for the side to move, handling captures, en passant,
+        casteling and promotion, and refreshes only the affected attacks.
+        Everything unmake_move needs is pushed onto the stack as
+        (move, moved kind, captured piece code, captured square, castling,
+        en passant, halfmove clock, hash, attack maps, saved attacks)
+        """
+        frm, to, promotion = move_from(move), move_to(move), move_promotion(move)
+        code = self.squares[frm]
+        color, kind = code >> 3, code & 7
+        changed = (1 << frm) | (1 << to)
+        key = self.hash
+        self.hash ^= CASTLING_KEYS[self.castling] ^ self._ep_key()
+
+        captured, captured_sq = self.squares[to], to
+        if captured:
+            self.remove(to)
+        elif kind == PAWN and to == self.ep:
+            captured_sq = to - 8 if color == WHITE else to + 8
+            captured = self.squares[captured_sq]
+            self.remove(captured_sq)
+            changed |= 1 << captured_sq
+
+        self.remove(frm)
+        self.put(to, color, promotion or kind)
+
+        if kind == KING and abs(to - frm) == 2:
+            _, _, rook, rook_to = CASTLES[CASTLE_TARGETS[to]]
+            self.remove(rook)
+            self.put(rook_to, color, ROOK)
+            changed |= (1 << rook) | (1 << rook_to)
+
+        # attack maps are stored as a tuple, copies of the position share undo records
+        record = (move, kind, captured, captured_sq, self.castling, self.ep, self.halfmove, key, tuple(self.attack_map))
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        self.ep = (frm + to) // 2 if kind == PAWN and abs(to - frm) == 16 else None
+        self.halfmove = 0 if kind == PAWN or captured else self.halfmove + 1
+        self.fullmove += self.turn
+        self.turn ^= 1
+        self.hash ^= CASTLING_KEYS[self.castling] ^ self._ep_key() ^ TURN_KEY
+        self.stack.append(record + (self.refresh(changed),))
+
+    def unmake_move(self) -> int:
+        """
+        Takes back the last played move by restoring its undo record,
+        no attacks are recomputed. Returns the move taken back
+        """
+        move, kind, captured, captured_sq, self.castling, self.ep, self.halfmove, key, attack_map, saved = self.stack.pop()
+        self.attack_map = list(attack_map)
+        frm, to = move_from(move), move_to(move)
+        self.turn ^= 1
+        self.fullmove -= self.turn
+
+        self.remove(to)
+        self.put(frm, self.turn, kind)
+        if kind == KING and abs(to - frm) == 2:
+            _, _, rook, rook_to = CASTLES[CASTLE_TARGETS[to]]
+            self.remove(rook_to)
+            self.put(rook, self.turn, ROOK)
+        if captured:
+            self.put(captured_sq, captured >> 3, captured & 7)
+
+        for sq, attacks in saved:
+            self.attacks_from[sq] = attacks
+        self.hash = key
+        return move
+
+    def last_move(self) -> int | None:
+        return self.stack[-1][0] if self.stack else None
+
+    def last_captured(self) -> tuple[int, int] | None:
+        # (color, kind) captured by the last move
+        if not self.stack or not (code := self.stack[-1][2]):
+            return None
+        return code >> 3, code & 7
+
+    def occupancy(self) -> int:
+        return self.occupied[WHITE] | self.occupied[BLACK]
+
+    def king_square(self, color: int) -> int:
+        return self.pieces[color][KING].bit_length() - 1
+
+    def attacks(self, sq: int, occ: int = None) -> int:
+        """
+        Returns bitboard of squares attacked by the piece on sq,
+        own pieces included (those are the defended ones)
+        """
+        code = self.squares[sq]
+        color, kind = code >> 3, code & 7
+        if occ is None:
+            occ = self.occupancy()
+        if kind == PAWN: return PAWN_ATTACKS[color][sq]
+        if kind == KNIGHT: return KNIGHT_ATTACKS[sq]
+        if kind == BISHOP: return bishop_attacks(occ, sq)
+        if kind == ROOK: return rook_attacks(occ, sq)
+        if kind == QUEEN: return queen_attacks(occ, sq)
+        return KING_ATTACKS[sq]
+
+    def attackers(self, sq: int, color: int, occ: int = None) -> int:
+        # bitboard of color's pieces attacking sq
+        if occ is None:
+            occ = self.occupancy()
+        pieces = self.pieces[color]
+        diagonal = pieces[BISHOP] | pieces[QUEEN]
+        straight = pieces[ROOK] | pieces[QUEEN]
+        return ((PAWN_ATTACKS[color ^ 1][sq] & pieces[PAWN]) |
+                (KNIGHT_ATTACKS[sq] & pieces[KNIGHT]) |
+                (KING_ATTACKS[sq] & pieces[KING]) |
+                (bishop_attacks(occ, sq) & diagonal) |
+                (rook_attacks(occ, sq) & straight))
+
+    def is_attacked(self, sq: int, color: int) -> bool:
+        # is sq attacked by color, constant time lookup
+        return (self.attack_map[color] >> sq) & 1 == 1
+
+    def in_check(self, color: int = None) -> bool:
+        if color is None:
+            color = self.turn
+        return self.is_attacked(self.king_square(color), color ^ 1)
+
+    def targets(self, sq: int) -> int:
+        """
+        Returns bitboard of squares the piece on sq can move to,
+        ignoring pins and checks against its own king.
+        King can't step on attacked squares and may castle
+        """
+        code = self.squares[sq]
+        color, kind = code >> 3, code & 7
+        own, enemy = self.occupied[color], self.occupied[color ^ 1]
+        occ = own | enemy
+
+        if kind == PAWN:
+            step = 8 if color == WHITE else -8
+            targets = 0
+            if 0 <= sq + step < 64 and not occ & (1 << (sq + step)):
+                targets |= 1 << (sq + step)
+                start = sq >> 3 == (1 if color == WHITE else 6)
+                if start and not occ & (1 << (sq + 2 * step)):
+                    targets |= 1 << (sq + 2 * step)
+            captures = enemy
+            if self.ep is not None and color == self.turn:
+                captures |= 1 << self.ep
+            return targets | (PAWN_ATTACKS[color][sq] & captures)
+
+        if kind == KING:
+            attacked = self.attack_map[color ^ 1]
+            # sliders see through the king, so it can't retreat along their ray
+            enemy = self.pieces[color ^ 1]
+            for slider in bits(enemy[BISHOP] | enemy[ROOK] | enemy[QUEEN]):
+                if self.attacks_from[slider] & (1 << sq):
+                    attacked |= self.attacks(slider, occ & ~(1 << sq))
+            targets = KING_ATTACKS[sq] & ~own & ~attacked
+            if not attacked & (1 << sq):
+                for right, (king, to, rook, rook_to) in CASTLES.items():
+                    if (self.castling & right and king == sq and self.squares[rook] == color << 3 | ROOK
+                            and not self._castle_blocked(king, rook, occ)
+                            and not attacked & ((1 << to) | (1 << rook_to))):
+                        targets |= 1 << to
+            return targets
+
+        return self.attacks_from[sq] & ~own
+
+    def _castle_blocked(self, king: int, rook: int, occ: int) -> bool:
+        low, high = min(king, rook), max(king, rook)
+        between = ((1 << high) - 1) & ~((1 << (low + 1)) - 1)
+        return (occ & between) != 0
+
+    def checkers(self) -> int:
+        # enemy pieces giving check to the side to move
+        return self.attackers(self.king_square(self.turn), self.turn ^ 1)
+
+    def pins(self) -> dict[int, int]:
+        """
+        Returns {pinned square: squares it may still move to}
+        for pieces of the side to move pinned against their king
+        """
+        color = self.turn
+        king = self.king_square(color)
+        enemy, enemy_occ = self.pieces[color ^ 1], self.occupied[color ^ 1]
+        # enemy sliders that would see the king if own pieces were gone
+        snipers = ((rook_attacks(enemy_occ, king) & (enemy[ROOK] | enemy[QUEEN])) |
+                   (bishop_attacks(enemy_occ, king) & (enemy[BISHOP] | enemy[QUEEN])))
+        occ = self.occupancy()
+        pins = {}
+        for sniper in bits(snipers):
+            blockers = BETWEEN[king][sniper] & occ
+            if blockers and not blockers & (blockers - 1) and blockers & self.occupied[color]:
+                pins[lsb(blockers)] = BETWEEN[king][sniper] | (1 << sniper)
+        return pins
+
+    def legal_targets(self) -> dict[int, int]:
+        """
+        Returns {from square: bitboard of legal destinations} for the side to move.
+        Pins, checkers and the check evasion mask are computed once
+        and pseudo-legal targets are filtered with them, no move is played
+        """
+        return dict(self._legal_pieces())
+
+    def _legal_pieces(self, king_last: bool = False):
+        """
+        Yields (from square, bitboard of legal destinations) of the side to
+        move's pieces one piece at a time, the king first unless king_last
+        """
+        color = self.turn
+        king = self.king_square(color)
+        checkers = self.checkers()
+        # in double check only the king may move
+        if checkers & (checkers - 1):
+            yield king, self.targets(king)
+            return
+        if not king_last:
+            yield king, self.targets(king)
+        evasions = BETWEEN[king][lsb(checkers)] | checkers if checkers else FULL
+        pins = self.pins()
+
+        for frm in bits(self.occupied[color] & ~(1 << king)):
+            yield frm, self._legal_from(frm, evasions & pins.get(frm, FULL))
+        if king_last:
+            yield king, self.targets(king)
+
+    def _legal_from(self, frm: int, allowed: int) -> int:
+        # targets of the piece on frm (not the king) limited to allowed squares
+        targets = self.targets(frm)
+        if self.ep is not None and targets & (1 << self.ep) and self.squares[frm] & 7 == PAWN:
+            # en passant removes two pieces from a line, checked directly
+            ep = (1 << self.ep) if self._ep_legal(frm) else 0
+            return (targets & ~(1 << self.ep) & allowed) | ep
+        return targets & allowed
+
+    def piece_targets(self, frm: int) -> int:
+        """
+        Returns bitboard of legal destinations of the piece on frm,
+        0 if it isn't one of the side to move's. Other pieces aren't generated
+        """
+        color = self.turn
+        if not self.occupied[color] >> frm & 1:
+            return 0
+        king = self.king_square(color)
+        if frm == king:
+            return self.targets(king)
+        checkers = self.checkers()
+        if checkers & (checkers - 1):
+            return 0
+        evasions = BETWEEN[king][lsb(checkers)] | checkers if checkers else FULL
+        return self._legal_from(frm, evasions & self.pins().get(frm, FULL))
+
+    def has_legal_move(self) -> bool:
+        # stops at the first piece that can move, the king is tried last
+        return any(targets for _, targets in self._legal_pieces(king_last = True))
+
+    def _ep_legal(self, frm: int) -> bool:
+        color = self.turn
+        captured = self.ep - 8 if color == WHITE else self.ep + 8
+        occ = (self.occupancy() & ~(1 << frm) & ~(1 << captured)) | (1 << self.ep)
+        return not self.attackers(self.king_square(color), color ^ 1, occ) & ~(1 << captured)
+
+    def legal_moves(self) -> list[int]:
+        moves = []
+        promotion_rank = RANK_8 if self.turn == WHITE else RANK_1
+        for frm, targets in self.legal_targets().items():
+            if self.squares[frm] & 7 == PAWN and targets & promotion_rank:
+                for to in bits(targets):
+                    moves += [make(frm, to, kind) for kind in (QUEEN, ROOK, BISHOP, KNIGHT)]
+            else:
+                moves += [make(frm, to) for to in bits(targets)]
+        return moves
+
+    def generate(self, stages: tuple[int, ...] = STAGES):
+        """
+        Yields legal moves of the given stages in that order: captures and
+        queen promotions, quiet moves giving direct check, then the other
+        quiet moves and underpromotions. Legal targets are worked out a
+        piece at a time while the first stage is yielded and kept for the
+        later ones, so callers stopping early skip the remaining pieces and
+        callers of captures only never make quiet moves
+        """
+        color = self.turn
+        pieces, done = self._legal_pieces(), []
+
+        def legal():
+            yield from done
+            for item in pieces:
+                done.append(item)
+                yield item
+
+        enemy = self.occupied[color ^ 1]
+        promotion_rank = RANK_8 if color == WHITE else RANK_1
+        # pawns also capture en passant and all their promotions are noisy
+        pawn_noisy = enemy | promotion_rank | (1 << self.ep if self.ep is not None else 0)
+        checks = [0] * 7
+        if CHECKS in stages:
+            # checks[kind] -> squares from which kind attacks the enemy king
+            king, occ = self.king_square(color ^ 1), self.occupancy()
+            diagonal, straight = bishop_attacks(occ, king), rook_attacks(occ, king)
+            checks = [0, PAWN_ATTACKS[color ^ 1][king], KNIGHT_ATTACKS[king], diagonal, straight, diagonal | straight, 0]
+
+        for stage in stages:
+            for frm, targets in legal():
+                kind = self.squares[frm] & 7
+                noisy = targets & (pawn_noisy if kind == PAWN else enemy)
+                if stage == CAPTURES:
+                    for to in bits(noisy):
+                        yield make(frm, to, QUEEN if kind == PAWN and promotion_rank >> to & 1 else 0)
+                elif stage == CHECKS:
+                    for to in bits(targets & ~noisy & checks[kind]):
+                        yield make(frm, to)
+                else:
+                    for to in bits(targets & ~noisy & ~checks[kind]):
+                        yield make(frm, to)
+                    if kind == PAWN:
+                        for to in bits(targets & promotion_rank):
+                            yield from (make(frm, to, promotion) for promotion in (ROOK, BISHOP, KNIGHT))
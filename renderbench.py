@@ -0,0 +1,128 @@
+"""
+Headless frame-time benchmark of the GUI drawing code.
+
+Opens the game on SDL's dummy video driver, so it runs on hosts without
+a display, and times Game.redraw in three states: the main menu with
+the mouse moving over its buttons, every position of scripted games and
+the same positions with a piece selected. Reports p50/p95/p99 frame
+times of each state. Every run is appended to a history file and its
+p95 is compared with earlier runs, a noticeably slower one is reported
+as a regression and the exit code is 1.
+
+Usage:
+    python renderbench.py                    replay the built-in game
+    python renderbench.py games.pgn -f 20    replay stored games, 20 frames per position
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import game
+import pgn
+import timings
+from position import START_FEN
+
+HISTORY_FILE = "render_history.jsonl"
+# frames per position or menu hover
+FRAMES = 10
+
+# Morphy vs Duke of Brunswick and Count Isouard, Paris 1858
+OPERA_GAME = ("e4 e5 Nf3 d6 d4 Bg4 dxe5 Bxf3 Qxf3 dxe5 Bc4 Nf6 Qb3 Qe7 Nc3 c6 Bg5 b5 Nxb5 cxb5 "
+              "Bxb5+ Nbd7 O-O-O Rd8 Rxd7 Rxd7 Rd1 Qe6 Bxd7+ Nxd7 Qb8+ Nxb8 Rd8#").split()
+
+
+def timed(g: game.Game, frames: int) -> list[float]:
+    # milliseconds each of frames redraws took
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        g.redraw()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def bench_menu(g: game.Game, frames: int) -> list[float]:
+    g.MainMenu = True
+    # the mouse goes over every button and off them, hovers change what is drawn
+    spots = [(btn.abs_x + btn.width // 2, btn.abs_y + btn.height // 2)
+             for btn in (g.OpponentBtn, g.ComputerBtn, g.OnlineBtn)] + [(0, 0)]
+    times = []
+    for spot in spots:
+        g.mouse_pos = spot
+        times += timed(g, frames)
+    g.MainMenu = False
+    g.mouse_pos = (0, 0)
+    return times
+
+def bench_games(g: game.Game, games, frames: int) -> tuple[list[float], list[float]]:
+    """
+    Replays games and returns frame times of every position before
+    the game ended, without and with a selected piece
+    """
+    midgame, selected = [], []
+    for headers, moves in games:
+        g.fen = headers.get("FEN", START_FEN)
+        g.reset()
+        g.singleplayer = True
+        for san in moves:
+            midgame += timed(g, frames)
+            # piece with most walkable tiles shows the most circles
+            g.active_piece = max((piece for piece in g.pieces if piece.color == g.turn),
+                                 key = lambda piece: len(g.match.targets(piece.tile)))
+            g.active_piece.where_to_go = g.match.targets(g.active_piece.tile)
+            selected += timed(g, frames)
+            g.active_piece.where_to_go = []
+            g.active_piece = None
+            g.make_move(pgn.parse_san(g.match.position, san))
+            if g.end:
+                break
+    return midgame, selected
+
+def percentiles(times: list[float]) -> dict:
+    cuts = statistics.quantiles(times, n = 100, method = "inclusive")
+    return {"frames": len(times), "p50": round(cuts[49], 3), "p95": round(cuts[94], 3),
+            "p99": round(cuts[98], 3), "max": round(max(times), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Headless redraw frame-time benchmark")
+    parser.add_argument("files", nargs = "*", help = "PGN files of games to replay (default: built-in game)")
+    parser.add_argument("-f", "--frames", type = int, default = FRAMES, help = "frames per position or menu hover")
+    parser.add_argument("--history", default = HISTORY_FILE, help = "timing history file")
+    parser.add_argument("--no-history", action = "store_true", help = "don't read or write timing history")
+    parser.add_argument("--tolerance", type = float, default = 0.25, help = "allowed slowdown of p95 before a regression is reported")
+    args = parser.parse_args()
+
+    games = [({}, OPERA_GAME)]
+    if args.files:
+        games = []
+        for path in args.files:
+            with open(path, encoding = "utf-8", errors = "replace") as file:
+                games += [(headers, moves) for headers, moves, _ in pgn.read_games(file)]
+
+    g = game.Game(headless = True)
+    g.update(setup = True)
+    # sprites and glyphs are cached on the first frames
+    timed(g, 1)
+    menu = bench_menu(g, args.frames)
+    midgame, selected = bench_games(g, games, args.frames)
+    g.engine.close()
+
+    history = [] if args.no_history else timings.load(args.history)
+    regressed = False
+    print(f"{'state':<12}{'frames':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for state, times in (("menu", menu), ("midgame", midgame), ("selected", selected)):
+        result = {"state": state, **percentiles(times)}
+        status = ""
+        if (best := timings.regression(result, history, ("state",), "p95", args.tolerance, lower_is_better = True)) is not None:
+            status = f"  REGRESSION (best p95 {best} ms)"
+            regressed = True
+        print(f"{state:<12}{result['frames']:>8}{result['p50']:>10.3f}{result['p95']:>10.3f}"
+              f"{result['p99']:>10.3f}{result['max']:>10.3f}{status}")
+
+        if not args.no_history:
+            timings.append(args.history, result)
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Process-wide sprite atlas for chess piece images and the board.
+Every image is loaded from disk and scaled once per piece,
+color and consts.SIDE, pieces only reference the cached surface.
+The board with its coordinates, the translucent overlays (move
+circles, last move and check plates) and the clock glyphs are rendered
+once per size and colors.
+"""
+
+import pygame as pg
+import consts
+
+# Figure.symb -> image file prefix
+NAMES = {"K": "KING", "Q": "QUEEN", "R": "ROOK", "B": "BISHOP", "N": "KNIGHT", "": "PAWN"}
+
+# (symb, color, side) -> scaled surface
+_atlas = {}
+
+def get(symb: str, color: str) -> pg.Surface:
+    key = (symb, color, consts.SIDE)
+    if (image := _atlas.get(key)) is None:
+        image = pg.transform.scale2x(pg.image.load(f"images/{NAMES[symb]}_{color.upper()}.png").convert_alpha())
+        _atlas[key] = image
+    return image
+
+def thumbnail(symb: str, color: str) -> pg.Surface:
+    # small image of a captured piece
+    key = (symb, color, consts.SIDE, consts.EATEN_SIZE)
+    if (image := _atlas.get(key)) is None:
+        image = pg.transform.scale(get(symb, color), (consts.EATEN_SIZE, consts.EATEN_SIZE))
+        _atlas[key] = image
+    return image
+
+def background(font: pg.font.Font) -> pg.Surface:
+    """
+    Returns the empty board with file and rank labels,
+    it's only rebuilt if the tile size or colors change
+    """
+    key = ("board", consts.SIDE, consts.LIGHT_TILE_COLOR, consts.DARK_TILE_COLOR, font)
+    if (board := _atlas.get(key)) is not None:
+        return board
+
+    board = pg.Surface((consts.WIDTH, consts.HEIGHT))
+    for i in range(8):
+        for j in range(8):
+            color = consts.LIGHT_TILE_COLOR if (i + j) % 2 == 0 else consts.DARK_TILE_COLOR
+            pg.draw.rect(board, color, (i * consts.SIDE, j * consts.SIDE, consts.SIDE, consts.SIDE))
+
+    # labels take the color of the other tiles
+    for i, letter in enumerate("abcdefgh"):
+        letter_image = font.render(letter, True, consts.DARK_TILE_COLOR if i % 2 else consts.LIGHT_TILE_COLOR)
+        board.blit(letter_image, ((i + 1) * consts.SIDE - letter_image.get_width() - consts.LETTER_BUFFER, consts.HEIGHT - letter_image.get_height() - consts.LETTER_BUFFER))
+    for i, num in enumerate("12345678"):
+        num_image = font.render(num, True, consts.DARK_TILE_COLOR if i % 2 else consts.LIGHT_TILE_COLOR)
+        board.blit(num_image, (consts.LETTER_BUFFER, consts.LETTER_BUFFER + consts.HEIGHT - (i + 1) * consts.SIDE))
+
+    _atlas[key] = board
+    return board
+
+def plate(color: tuple[int], alpha: int) -> pg.Surface:
+    # translucent square of a whole tile, used for last move and check highlights
+    key = ("plate", consts.SIDE, color, alpha)
+    if (surface := _atlas.get(key)) is None:
+        surface = pg.Surface((consts.SIDE, consts.SIDE))
+        surface.set_colorkey(consts.BLACK)
+        surface.set_alpha(alpha)
+        surface.fill(color)
+        _atlas[key] = surface
+    return surface
+
+def circle() -> pg.Surface:
+    # translucent circle in the middle of a tile, marks a walkable tile
+    key = ("circle", consts.SIDE, consts.CIRCLE_COLOR, consts.RADIUS)
+    if (surface := _atlas.get(key)) is None:
+        surface = pg.Surface((consts.SIDE, consts.SIDE))
+        surface.set_colorkey(consts.BLACK)
+        surface.set_alpha(100)
+        pg.draw.circle(surface, consts.CIRCLE_COLOR, (consts.SIDE // 2, consts.SIDE // 2), consts.RADIUS)
+        _atlas[key] = surface
+    return surface
+
+def glyphs(font: pg.font.Font, color: tuple[int]) -> dict[str, pg.Surface]:
+    # rendered characters of clocks, a clock is drawn with a few blits
+    key = ("glyphs", font, color)
+    if (images := _atlas.get(key)) is None:
+        images = {char: font.render(char, True, color) for char in "0123456789:."}
+        _atlas[key] = images
+    return images
@@ -0,0 +1,403 @@
+"""
+Endgame tablebases with distance to mate, built by retrograde analysis.
+
+A table covers one material signature such as "KQvK" or "KRvKP" (white
+pieces, then black ones, stronger side first) and holds one byte per
+(side to move, square of every piece) index: 0 is a draw, 255 an illegal
+position and any other value d + 1, where d is the distance to mate in
+plies. Even d means the side to move gets mated, odd d that it mates.
+Tables are read through mmap, so probing costs no load time and the
+pages are shared between processes.
+
+Generation first plays every move of every position (in parallel, in
+chunks saved to disk so an interrupted run resumes where it stopped).
+Captures and promotions are looked up in smaller tables, which are
+generated first. Then results spread backwards from mates through
+un-moves, one ply at a time. Castling and en passant are not part of
+tablebase positions.
+
+Indices aren't reduced by board symmetries, a table of n pieces has
+2 * 64^n of them, so tables are limited to 4 pieces (33 MB each).
+
+Usage:
+    python tablebase.py generate KQvK KRvK KPvK -w 8
+    python tablebase.py all -n 3
+    python tablebase.py probe --fen "<FEN>"
+"""
+
+import argparse
+import itertools
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import consts
+from bitboard import KING_ATTACKS, KNIGHT_ATTACKS, bishop_attacks, rook_attacks, queen_attacks, bits
+from position import (Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                      move_to, move_promotion, uci)
+
+DRAW, INVALID = 0, 255
+# outcome of the forward pass of a position
+UNKNOWN, MATED, STALEMATE = 0, 1, 2
+# counter of positions that can't be lost, they have a drawing capture
+SAFE = 255
+# indices handled by one task of the forward pass
+CHUNK = 1 << 16
+# most pieces of a table, kings included, 5-piece ones would take 2 GB each
+MAX_PIECES = 4
+
+LETTERS = "KQRBNP"
+KIND_OF = {"K": KING, "Q": QUEEN, "R": ROOK, "B": BISHOP, "N": KNIGHT, "P": PAWN}
+LETTER_OF = {kind: letter for letter, kind in KIND_OF.items()}
+
+
+def _strength(side: str) -> tuple:
+    return len(side), [-LETTERS.index(letter) for letter in side]
+
+def signature(pos: Position) -> tuple[str, bool]:
+    """
+    Returns material signature of pos and whether colors
+    have to be swapped so that the stronger side is white
+    """
+    sides = ["K" + "".join(letter * pos.pieces[color][KIND_OF[letter]].bit_count() for letter in LETTERS[1:])
+             for color in (WHITE, BLACK)]
+    if _strength(sides[WHITE]) >= _strength(sides[BLACK]):
+        return f"{sides[WHITE]}v{sides[BLACK]}", False
+    return f"{sides[BLACK]}v{sides[WHITE]}", True
+
+def pieces_of(sig: str) -> list[tuple[int, int]]:
+    # (color, kind) of every piece in index order
+    white, black = sig.split("v")
+    return [(WHITE, KIND_OF[letter]) for letter in white] + [(BLACK, KIND_OF[letter]) for letter in black]
+
+def signatures(count: int) -> list[str]:
+    # every signature of at most count pieces, kings included
+    sides = ["K" + "".join(extra) for n in range(count - 1)
+             for extra in itertools.combinations_with_replacement(LETTERS[1:], n)]
+    return sorted(f"{white}v{black}" for white in sides for black in sides
+                  if 2 < len(white) + len(black) <= count and _strength(white) >= _strength(black))
+
+def dependencies(sig: str) -> set[str]:
+    # signatures reached by one capture, promotion or both
+    found = set()
+    sides = sig.split("v")
+    for color in (WHITE, BLACK):
+        side, other = sides[color], sides[color ^ 1]
+        captured = [other] + [other[:i] + other[i + 1:] for i in range(1, len(other))]
+        for i, letter in enumerate(side):
+            if letter == "K":
+                continue
+            rest = side[:i] + side[i + 1:]
+            # piece of color is captured
+            found.add(_canonical(rest, other, color))
+            if letter == "P":
+                for promoted in "QRBN":
+                    for remaining in captured:
+                        found.add(_canonical("".join(sorted(rest + promoted, key = LETTERS.index)), remaining, color))
+    found.discard("KvK")
+    return found
+
+def _canonical(side: str, other: str, color: int) -> str:
+    white, black = (side, other) if color == WHITE else (other, side)
+    return f"{white}v{black}" if _strength(white) >= _strength(black) else f"{black}v{white}"
+
+
+class Tablebase:
+    def __init__(self, directory: str = consts.TABLEBASE_DIR):
+        self.directory = directory
+        # signature -> mapped table, opened on the first probe
+        self.tables = {}
+        self.refresh()
+
+    def refresh(self):
+        # looks for tables generated since
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        self.available = {name[:-3] for name in names if name.endswith(".tb")}
+        self.max_pieces = max((len(sig) - 1 for sig in self.available), default = 2)
+
+    def _table(self, sig: str):
+        if (table := self.tables.get(sig)) is None:
+            with open(os.path.join(self.directory, sig + ".tb"), "rb") as file:
+                table = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+            self.tables[sig] = table
+        return table
+
+    def probe(self, pos: Position) -> tuple[int, int] | None:
+        """
+        Returns (result, plies) for the side to move, result is 1 for a win,
+        0 for a draw and -1 for a loss, plies is distance to mate.
+        None if pos isn't covered by the available tables
+        """
+        count = pos.occupancy().bit_count()
+        if count == 2:
+            return 0, 0
+        if count > self.max_pieces or pos.castling:
+            return None
+        sig, swap = signature(pos)
+        if sig not in self.available:
+            return None
+        value = self._table(sig)[index(pos, sig, swap)]
+        if value == DRAW or value == INVALID:
+            return (0, 0) if value == DRAW else None
+        plies = value - 1
+        return (1 if plies % 2 else -1), plies
+
+    def best_move(self, pos: Position) -> int | None:
+        """
+        Returns the move keeping the best result: the fastest mate when
+        winning, the longest defence when losing and a drawing move otherwise.
+        None if pos or one of its children isn't covered
+        """
+        best, best_key = None, None
+        for move in pos.legal_moves():
+            pos.make_move(move)
+            found = self.probe(pos)
+            pos.unmake_move()
+            if found is None:
+                return None
+            # results of children are the opponent's
+            result, plies = found
+            key = (-result, -plies if result < 0 else plies if result > 0 else 0)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+
+def index(pos: Position, sig: str, swap: bool) -> int:
+    # table index of pos, with swap colors are exchanged and the board mirrored
+    flip = 56 if swap else 0
+    idx, factor = 0, 1
+    used = {}
+    for color, kind in pieces_of(sig):
+        color ^= swap
+        # same pieces take their squares in ascending order
+        board = pos.pieces[color][kind] & ~used.get((color, kind), 0)
+        low = board & -board
+        used[(color, kind)] = used.get((color, kind), 0) | low
+        idx += ((low.bit_length() - 1) ^ flip) * factor
+        factor <<= 6
+    return idx + (pos.turn ^ swap) * factor
+
+def _decode(idx: int, count: int) -> tuple[int, list[int]]:
+    return idx >> (6 * count), [(idx >> (6 * i)) & 63 for i in range(count)]
+
+def _position(turn: int, squares: list[int], pieces: list[tuple[int, int]]) -> Position | None:
+    # position of an index, None if it can't occur in a game
+    if len(set(squares)) != len(squares):
+        return None
+    pos = Position()
+    for sq, (color, kind) in zip(squares, pieces):
+        if kind == PAWN and sq >> 3 in (0, 7):
+            return None
+        pos.put(sq, color, kind)
+    pos.turn = turn
+    pos.refresh(pos.occupancy())
+    # side that just moved can't be left in check
+    if pos.in_check(turn ^ 1):
+        return None
+    return pos
+
+
+def _forward(sig: str, start: int, directory: str) -> str:
+    """
+    Plays all moves of positions in one chunk. Saves their outcome,
+    number of moves inside the table, the fastest win and the slowest
+    loss reached by a capture or promotion. Returns the chunk file
+    """
+    path = os.path.join(directory, f"{sig}.parts", f"{start // CHUNK:06d}")
+    if os.path.exists(path):
+        return path
+    pieces = pieces_of(sig)
+    tablebase = Tablebase(directory)
+    size = min(CHUNK, (2 << (6 * len(pieces))) - start)
+    status, counts, wins, losses = bytearray(size), bytearray(size), bytearray(size), bytearray(size)
+
+    for i in range(size):
+        pos = _position(*_decode(start + i, len(pieces)), pieces)
+        if pos is None:
+            status[i] = INVALID
+            continue
+        moves = pos.legal_moves()
+        if not moves:
+            status[i] = MATED if pos.in_check() else STALEMATE
+            continue
+        count = 0
+        them = pos.occupied[pos.turn ^ 1]
+        for move in moves:
+            if not (them >> move_to(move) & 1 or move_promotion(move)):
+                count += 1
+                continue
+            pos.make_move(move)
+            result, plies = tablebase.probe(pos)
+            pos.unmake_move()
+            if result < 0:
+                wins[i] = min(wins[i] or 255, plies + 1)
+            elif result == 0:
+                count = SAFE
+            else:
+                losses[i] = max(losses[i], plies + 1)
+        counts[i] = count if count < SAFE else SAFE
+    tablebase.close()
+
+    with open(path + ".tmp", "wb") as file:
+        file.write(status + counts + wins + losses)
+    os.replace(path + ".tmp", path)
+    return path
+
+def _unmoves(color: int, kind: int, sq: int, occ: int) -> int:
+    # squares the piece on sq could have come from without capturing
+    empty = ~occ
+    if kind == PAWN:
+        step = -8 if color == WHITE else 8
+        back = sq + step
+        if not 0 <= back < 64 or back >> 3 in (0, 7) or occ >> back & 1:
+            return 0
+        found = 1 << back
+        if sq >> 3 == (3 if color == WHITE else 4) and not occ >> (back + step) & 1:
+            found |= 1 << (back + step)
+        return found
+    if kind == KING:
+        return KING_ATTACKS[sq] & empty
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq] & empty
+    if kind == BISHOP:
+        return bishop_attacks(occ, sq) & empty
+    if kind == ROOK:
+        return rook_attacks(occ, sq) & empty
+    return queen_attacks(occ, sq) & empty
+
+def generate(sig: str, directory: str = consts.TABLEBASE_DIR, workers: int = 1, log = print):
+    """
+    Generates table of sig and every table it depends on,
+    tables already on disk are kept
+    """
+    if len(pieces_of(sig)) > MAX_PIECES:
+        raise ValueError(f"{sig}: tables have at most {MAX_PIECES} pieces")
+    path = os.path.join(directory, sig + ".tb")
+    if os.path.exists(path):
+        return
+    for dependency in sorted(dependencies(sig)):
+        generate(dependency, directory, workers, log)
+
+    pieces = pieces_of(sig)
+    count = len(pieces)
+    size = 2 << (6 * count)
+    os.makedirs(os.path.join(directory, f"{sig}.parts"), exist_ok = True)
+    log(f"{sig}: playing moves of {size} positions")
+    starts = range(0, size, CHUNK)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_forward, itertools.repeat(sig), starts, itertools.repeat(directory)))
+    else:
+        parts = [_forward(sig, start, directory) for start in starts]
+
+    status, counts, wins, losses = bytearray(), bytearray(), bytearray(), bytearray()
+    for part in parts:
+        with open(part, "rb") as file:
+            data = file.read()
+        length = len(data) // 4
+        status += data[:length]
+        counts += data[length:2 * length]
+        wins += data[2 * length:3 * length]
+        losses += data[3 * length:]
+
+    # layers[d] -> positions mated in d plies (d even) or mating in d plies (d odd)
+    layers = [[] for _ in range(INVALID)]
+    table = bytearray(size)
+    for idx in range(size):
+        if status[idx] == INVALID:
+            table[idx] = INVALID
+        elif status[idx] == MATED:
+            layers[0].append(idx)
+        elif status[idx] == UNKNOWN:
+            if wins[idx]:
+                layers[wins[idx]].append(idx)
+            elif counts[idx] == 0:
+                # only captures and promotions, all of them losing
+                layers[losses[idx]].append(idx)
+
+    for plies in range(INVALID - 1):
+        layer = layers[plies]
+        if not layer:
+            continue
+        for idx in layer:
+            if table[idx]:
+                continue
+            table[idx] = plies + 1
+            turn, squares = _decode(idx, count)
+            mover = turn ^ 1
+            occ = 0
+            for sq in squares:
+                occ |= 1 << sq
+            base = idx - (turn << (6 * count)) + (mover << (6 * count))
+            for i, (color, kind) in enumerate(pieces):
+                if color != mover:
+                    continue
+                for frm in bits(_unmoves(color, kind, squares[i], occ)):
+                    previous = base + ((frm - squares[i]) << (6 * i))
+                    if table[previous]:
+                        continue
+                    if plies % 2 == 0:
+                        # moving here mates
+                        layers[plies + 1].append(previous)
+                    elif counts[previous] != SAFE and not wins[previous]:
+                        counts[previous] -= 1
+                        if counts[previous] == 0:
+                            layers[max(plies + 1, losses[previous])].append(previous)
+        layers[plies] = None
+        log(f"{sig}: {len(layer)} positions at {plies} plies")
+
+    with open(path + ".tmp", "wb") as file:
+        file.write(table)
+    os.replace(path + ".tmp", path)
+    for part in parts:
+        os.remove(part)
+    os.rmdir(os.path.join(directory, f"{sig}.parts"))
+    log(f"{sig}: written to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Generate or probe endgame tablebases")
+    parser.add_argument("-d", "--directory", default = consts.TABLEBASE_DIR, help = "tablebase directory")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    generator = commands.add_parser("generate", help = "generate tables of given signatures, e.g. KQvK")
+    generator.add_argument("signatures", nargs = "+")
+    generator.add_argument("-w", "--workers", type = int, default = os.cpu_count(), help = "worker processes")
+    everything = commands.add_parser("all", help = "generate every table up to given number of pieces")
+    everything.add_argument("-n", "--pieces", type = int, default = 3, help = f"3 to {MAX_PIECES}")
+    everything.add_argument("-w", "--workers", type = int, default = os.cpu_count(), help = "worker processes")
+    prober = commands.add_parser("probe", help = "print result and best move of a position")
+    prober.add_argument("--fen", required = True)
+    args = parser.parse_args()
+
+    if args.command == "probe":
+        tablebase = Tablebase(args.directory)
+        pos = Position.from_fen(args.fen)
+        if (found := tablebase.probe(pos)) is None:
+            print("position is not covered")
+            return
+        result, plies = found
+        move = tablebase.best_move(pos)
+        print({1: f"win, mate in {plies} plies", 0: "draw", -1: f"loss, mated in {plies} plies"}[result],
+              f"best move {uci(move)}" if move is not None else "")
+        return
+
+    if args.command == "all" and not 3 <= args.pieces <= MAX_PIECES:
+        parser.error(f"tables have 3 to {MAX_PIECES} pieces")
+    sigs = args.signatures if args.command == "generate" else signatures(args.pieces)
+    for sig in sigs:
+        white, black = sig.split("v")
+        if _canonical(white, black, WHITE) != sig:
+            parser.error(f"{sig} should be written as {_canonical(white, black, WHITE)}")
+        if len(sig) - 1 > MAX_PIECES:
+            parser.error(f"{sig}: tables have at most {MAX_PIECES} pieces")
+    os.makedirs(args.directory, exist_ok = True)
+    for sig in sigs:
+        generate(sig, args.directory, args.workers)
+
+if __name__ == "__main__":
+    main()
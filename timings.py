@@ -0,0 +1,40 @@
+"""
+Timing history shared by the benchmarks, perft.py and renderbench.py.
+
+Every run appends one JSON line per measured case to a history file
+and is compared against recent runs of the same case, so slowdowns
+show up as regressions.
+"""
+
+import json
+import time
+
+# how many past runs a new one is compared against
+WINDOW = 10
+
+
+def load(path: str) -> list[dict]:
+    try:
+        with open(path) as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def append(path: str, result: dict):
+    # stamps result with the current time and adds it to the history
+    result["time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(path, "a") as file:
+        file.write(json.dumps(result) + "\n")
+
+def regression(result: dict, history: list[dict], keys: tuple[str, ...], metric: str,
+               tolerance: float, lower_is_better: bool = False) -> float | None:
+    """
+    Returns best metric of recent runs of the same case (equal in keys)
+    if result is worse than it by more than tolerance
+    """
+    past = [run[metric] for run in history if all(run.get(key) == result[key] for key in keys)][-WINDOW:]
+    if not past:
+        return None
+    if lower_is_better:
+        return min(past) if result[metric] > (1 + tolerance) * min(past) else None
+    return max(past) if result[metric] < (1 - tolerance) * max(past) else None
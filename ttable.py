@@ -0,0 +1,51 @@
+"""
+Fixed-size transposition table keyed by Zobrist hashes.
+
+Every bucket holds two slots: the first one keeps the entry searched
+to the greatest depth, the second one is always replaced. Values are
+opaque to the table, so it can cache legal moves and check status as
+well as search results.
+"""
+
+class TranspositionTable:
+    def __init__(self, size: int):
+        # number of buckets is rounded down to a power of two
+        self.mask = (1 << (size.bit_length() - 1)) - 1
+        self.keys = [None] * (2 * (self.mask + 1))
+        self.depths = [0] * (2 * (self.mask + 1))
+        self.values = [None] * (2 * (self.mask + 1))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return sum(key is not None for key in self.keys)
+
+    def probe(self, key: int, depth: int = 0):
+        """
+        Returns value stored for key with at least given depth,
+        None if there is no such entry
+        """
+        slot = (key & self.mask) << 1
+        for i in (slot, slot + 1):
+            if self.keys[i] == key and self.depths[i] >= depth:
+                self.hits += 1
+                return self.values[i]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value, depth: int = 0):
+        slot = (key & self.mask) << 1
+        # deeper (or same position) entries take the depth-preferred slot,
+        # the previous occupant is moved down to the always-replace slot
+        if self.keys[slot] in (None, key) or depth >= self.depths[slot]:
+            if self.keys[slot] not in (None, key):
+                self.keys[slot + 1], self.depths[slot + 1], self.values[slot + 1] = self.keys[slot], self.depths[slot], self.values[slot]
+            self.keys[slot], self.depths[slot], self.values[slot] = key, depth, value
+        else:
+            self.keys[slot + 1], self.depths[slot + 1], self.values[slot + 1] = key, depth, value
+
+    def clear(self):
+        self.keys = [None] * len(self.keys)
+        self.depths = [0] * len(self.depths)
+        self.values = [None] * len(self.values)
+        self.hits = self.misses = 0
@@ -0,0 +1,21 @@
+"""
+Zobrist keys used to hash positions.
+Keys come from a fixed seed so hashes are the same in every process,
+which lets them be stored in files and shared between workers.
+"""
+
+import random
+
+_random = random.Random(0x5EED)
+
+def _key() -> int:
+    return _random.getrandbits(64)
+
+# PIECE_KEYS[color][kind][sq], kind index 0 is unused
+PIECE_KEYS = [[[_key() for _ in range(64)] for _ in range(7)] for _ in range(2)]
+# CASTLING_KEYS[rights], one key per combination of the four rights bits
+CASTLING_KEYS = [_key() for _ in range(16)]
+# EP_KEYS[file] of the en passant square
+EP_KEYS = [_key() for _ in range(8)]
+# xor-ed in when black is to move
+TURN_KEY = _key()